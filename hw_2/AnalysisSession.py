@@ -0,0 +1,102 @@
+import numpy as np
+from DataMatrix import ResultMatrix
+
+# 会话中一次性获取的完整年份范围，之后调整年份只在本地截取
+FULL_YEARS = list(range(1980, 2030))
+
+
+class AnalysisSession:
+    """
+    单个会话的增量分析状态
+    会话内获取过的原始数据保存在一个覆盖完整年份范围的矩阵中：再次提交时只请求新增的指标或国家/地区，
+    年份范围在本地截取；同时记录每个图表的缓存键，只有输入变化的图表才需要重新渲染
+    """
+    def __init__(self, data_manager, derived_engine):
+        """
+        :param data_manager: DataManager
+        :param derived_engine: DerivedEngine，派生指标在截取后按当前的国家/地区组合计算
+        """
+        self.data_manager = data_manager
+        self.derived_engine = derived_engine
+        self.matrix = None
+        # 已获取的 (原始指标, 国家/地区) 组合
+        self.fetched = set()
+        self.errors = []
+        # 指标 -> 图表缓存键（或错误信息），以及指标 -> 图表所在的 scope
+        self.chart_keys = dict()
+        self.chart_scopes = dict()
+        self._scope_counter = 0
+
+    def _raw_indicators(self, indicators):
+        raw, _ = self.derived_engine.plan(indicators, [])
+        return raw
+
+    async def update(self, indicators, entities):
+        """
+        获取尚未获取过的 (指标, 国家/地区) 组合，缺少的国家/地区相同的指标合并为一次查询
+        上游请求失败的部分不记录为已获取，下次提交时重试；其中由过期缓存或快照补全的数据仍然合并显示
+        :return: 本次发起的查询数
+        """
+        missing = dict()
+        for indicator in self._raw_indicators(indicators):
+            indicator_missing = tuple(entity for entity in entities if (indicator, entity) not in self.fetched)
+            if indicator_missing:
+                missing.setdefault(indicator_missing, []).append(indicator)
+        self.errors = []
+        for query_entities, query_indicators in missing.items():
+            result = await self.data_manager.query_matrix_async(query_indicators, list(query_entities), FULL_YEARS)
+            self.matrix = result if self.matrix is None else self.matrix.merge(result)
+            if result.error:
+                self.errors.append(result.warnings[:2])
+                continue
+            self.fetched.update((indicator, entity) for indicator in query_indicators for entity in query_entities)
+        return len(missing)
+
+    def view(self, indicators, entities, start_year, end_year):
+        """
+        从会话数据中截取当前选择，派生指标按当前选择计算
+        :return: ResultMatrix，警告包括本次请求的错误和没有数据的国家/地区
+        """
+        years = list(range(start_year, end_year + 1))
+        raw, query_years = self.derived_engine.plan(indicators, years)
+        if self.matrix is None:
+            source = ResultMatrix(raw, entities, query_years)
+        else:
+            source = self.matrix.select(raw, entities, query_years)
+        result = self.derived_engine.evaluate(source, indicators, years)
+        result.warnings = [warning for warnings in self.errors for warning in warnings]
+        for i, indicator in enumerate(result.indicators):
+            for e in np.flatnonzero(~result.mask[i].any(axis=1)):
+                result.warnings.append(f"警告: {result.entities[e]} 在指标 {indicator} 中没有数据")
+        return result
+
+    def chart_changed(self, indicator, key):
+        """
+        :param key: 图表的缓存键（或不能绘制时的错误信息）
+        :return: 图表的输入是否与上次显示时不同
+        """
+        return self.chart_keys.get(indicator) != key
+
+    def chart_scope(self, indicator):
+        """
+        :return: (指标图表所在的 scope 名称, 是否为新建)
+        """
+        scope = self.chart_scopes.get(indicator)
+        if scope is not None:
+            return scope, False
+        self._scope_counter += 1
+        scope = self.chart_scopes[indicator] = f'chart_{self._scope_counter}'
+        return scope, True
+
+    def drop_charts(self, keep):
+        """
+        移除不再选择的指标的图表记录
+        :param keep: 当前选择的指标
+        :return: 需要移除的 scope 名称列表
+        """
+        removed = []
+        for indicator in list(self.chart_scopes):
+            if indicator not in keep:
+                removed.append(self.chart_scopes.pop(indicator))
+                self.chart_keys.pop(indicator, None)
+        return removed
@@ -0,0 +1,313 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from urllib.request import urlopen
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+MOCK_PATH = '/external/datamapper/api/v1'
+
+# 每个场景的参数规模
+SCALES = {
+    'quick': {'entities': [1, 10, 50], 'spans': [5, 50], 'sessions': [1, 4], 'repeat': 3},
+    'full': {'entities': [1, 10, 50, 200], 'spans': [5, 20, 50], 'sessions': [1, 4, 16, 32], 'repeat': 5},
+}
+
+
+def summarize(samples):
+    """
+    :param samples: 耗时列表（秒）
+    :return: 统计信息（毫秒）
+    """
+    samples = np.asarray(samples, dtype=float) * 1000
+    return {
+        'n': int(samples.size),
+        'mean_ms': round(float(samples.mean()), 3),
+        'p50_ms': round(float(np.percentile(samples, 50)), 3),
+        'p95_ms': round(float(np.percentile(samples, 95)), 3),
+        'min_ms': round(float(samples.min()), 3),
+        'max_ms': round(float(samples.max()), 3),
+    }
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class MockServerProcess:
+    """
+    在子进程中运行 MockImfServer，避免与被测代码争用同一个解释器
+    """
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503):
+        self.port = free_port()
+        self.args = [sys.executable, os.path.join(MODULE_DIR, 'MockImfServer.py'), '--port', str(self.port),
+                     '--latency', str(latency), '--jitter', str(jitter),
+                     '--error-rate', str(error_rate), '--error-status', str(error_status)]
+        self.process = None
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.port}{MOCK_PATH}'
+
+    def stats(self):
+        with urlopen(f'http://127.0.0.1:{self.port}/_stats') as response:
+            return json.load(response)
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.args, stdout=subprocess.DEVNULL)
+        deadline = time.time() + 15
+        while time.time() < deadline:
+            try:
+                self.stats()
+                return self
+            except OSError:
+                time.sleep(0.05)
+        self.process.kill()
+        raise RuntimeError('模拟服务器启动失败')
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.wait()
+
+
+class Benchmark:
+    """
+    基准测试：BasicInfoManager 启动、数据查询与解析、图表渲染、完整会话模拟
+    所有请求发往本地模拟服务器，结果以JSON保存，可与基线比较
+    """
+    INDICATORS = ['NGDP_RPCH', 'NGDPD', 'LP', 'PCPIPCH']
+
+    def __init__(self, server, scale, work_dir):
+        """
+        :param server: MockServerProcess
+        :param scale: SCALES 中的一项
+        :param work_dir: 临时目录（缓存和目录文件）
+        """
+        self.server = server
+        self.scale = scale
+        self.work_dir = work_dir
+        self.results = []
+        with open(os.path.join(MODULE_DIR, 'available_entities.json'), 'r') as f:
+            self.all_entities = list(json.load(f))
+        self._counter = 0
+
+    def client(self):
+        from HttpClient import ImfClient
+        # 不限流，测量的是本地处理开销
+        return ImfClient(base_url=self.server.base_url, rate=10 ** 6, burst=10 ** 6, backoff_base=0.01)
+
+    def temp_path(self, name):
+        self._counter += 1
+        return os.path.join(self.work_dir, f'{name}-{self._counter}')
+
+    def record(self, name, params, samples, **extra):
+        result = {'name': name, 'params': params, 'stats': summarize(samples)}
+        result.update(extra)
+        self.results.append(result)
+        print(f"{name:<22} {json.dumps(params):<48} p50={result['stats']['p50_ms']:>10.2f}ms "
+              f"p95={result['stats']['p95_ms']:>10.2f}ms", flush=True)
+
+    def entities(self, count, seed=0):
+        return random.Random(seed).sample(self.all_entities, count)
+
+    def years(self, span):
+        return list(range(2029 - span + 1, 2030))
+
+    def bench_startup(self):
+        """BasicInfoManager 启动：本地没有目录文件（需请求API）与已有目录文件两种情况"""
+        from DataManager import BasicInfoManager
+        cold, warm = [], []
+        for _ in range(self.scale['repeat']):
+            catalog_dir = self.temp_path('catalog')
+            client = self.client()
+            start = time.perf_counter()
+            BasicInfoManager(client=client, catalog_dir=catalog_dir, catalog_seed_dir=None)
+            cold.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            BasicInfoManager(client=client, catalog_dir=catalog_dir, catalog_seed_dir=None)
+            warm.append(time.perf_counter() - start)
+        self.record('startup', {'catalog': 'remote'}, cold)
+        self.record('startup', {'catalog': 'local'}, warm)
+
+    def bench_query(self):
+        """数据查询：缓存为空（请求+解析+写缓存）与缓存命中两种情况"""
+        from DataManager import DataManager
+        client = self.client()
+        for count in self.scale['entities']:
+            for span in self.scale['spans']:
+                entities, years = self.entities(count), self.years(span)
+                cold, warm = [], []
+                for _ in range(self.scale['repeat']):
+                    data_manager = DataManager(cache_path=self.temp_path('cache'), client=client)
+                    start = time.perf_counter()
+                    data_manager.query_matrix(self.INDICATORS[:2], entities, years)
+                    cold.append(time.perf_counter() - start)
+                    start = time.perf_counter()
+                    data_manager.query_matrix(self.INDICATORS[:2], entities, years)
+                    warm.append(time.perf_counter() - start)
+                    data_manager.cache.close()
+                    data_manager.fetch_executor.shutdown()
+                params = {'indicators': 2, 'entities': count, 'years': span}
+                self.record('query', dict(params, cache='cold'), cold)
+                self.record('query', dict(params, cache='warm'), warm)
+
+    def bench_render(self):
+        """图表渲染：不使用图表缓存，直接在当前进程渲染"""
+        from DataManager import DataManager
+        from DataVisualizer import DataVisualizer
+        data_manager = DataManager(cache_path=self.temp_path('cache'), client=self.client())
+        for count in self.scale['entities']:
+            for span in self.scale['spans']:
+                entities = self.entities(count)
+                matrix = data_manager.query_matrix(['NGDPD'], entities, self.years(span))
+                data_visualizer = DataVisualizer(matrix)
+                for fmt in ('png', 'svg'):
+                    samples = []
+                    for _ in range(self.scale['repeat']):
+                        start = time.perf_counter()
+                        img = data_visualizer.plot_data('NGDPD', 'GDP', 'USD', entities, fmt=fmt,
+                                                        max_points=40 if fmt == 'svg' else None)
+                        samples.append(time.perf_counter() - start)
+                    self.record('render', {'format': fmt, 'entities': count, 'years': span}, samples, bytes=len(img))
+        data_manager.cache.close()
+        data_manager.fetch_executor.shutdown()
+
+    def bench_sessions(self):
+        """
+        模拟完整的分析会话：异步查询两个指标并在渲染进程池中生成图表
+        并发会话使用不同的国家/地区组合，每个并发级别使用新的缓存
+        """
+        from DataManager import DataManager
+        from DataVisualizer import DataVisualizer
+        from RenderEngine import RenderEngine
+        render_engine = RenderEngine()
+        render_engine.warm_up()
+        indicators = self.INDICATORS[:2]
+
+        async def session(data_manager, seed):
+            entities = self.entities(5, seed)
+            start = time.perf_counter()
+            matrix = await data_manager.query_matrix_async(indicators, entities, self.years(50))
+            data_visualizer = DataVisualizer(matrix)
+            await asyncio.gather(*[
+                render_engine.render_async(data_visualizer, indicator, indicator, '', entities)
+                for indicator in indicators if matrix.has_data(indicator)
+            ])
+            return time.perf_counter() - start
+
+        async def run(concurrency):
+            data_manager = DataManager(cache_path=self.temp_path('cache'), client=self.client())
+            samples = []
+            start = time.perf_counter()
+            for round_ in range(self.scale['repeat']):
+                samples += await asyncio.gather(*[session(data_manager, round_ * 1000 + i) for i in range(concurrency)])
+            elapsed = time.perf_counter() - start
+            data_manager.cache.close()
+            data_manager.fetch_executor.shutdown()
+            return samples, elapsed
+
+        for concurrency in self.scale['sessions']:
+            samples, elapsed = asyncio.run(run(concurrency))
+            self.record('session', {'concurrency': concurrency}, samples,
+                        sessions_per_s=round(len(samples) / elapsed, 3))
+        render_engine.shutdown()
+
+
+def compare(results, baseline, threshold):
+    """
+    与基线比较 p50 耗时
+    :return: 变慢超过 threshold 的场景列表
+    """
+    def key(result):
+        return result['name'], json.dumps(result['params'], sort_keys=True)
+    base = {key(result): result for result in baseline['results']}
+    regressions = []
+    print(f"\n{'场景':<22} {'参数':<48} {'基线p50':>10} {'当前p50':>10} {'比值':>7}")
+    for result in results:
+        old = base.get(key(result))
+        if old is None:
+            continue
+        ratio = result['stats']['p50_ms'] / max(old['stats']['p50_ms'], 1e-6)
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  <-- 变慢'
+            regressions.append(result)
+        print(f"{result['name']:<22} {json.dumps(result['params']):<48} {old['stats']['p50_ms']:>10.2f} "
+              f"{result['stats']['p50_ms']:>10.2f} {ratio:>7.2f}{flag}")
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=MODULE_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='基于本地模拟 IMF API 的基准测试')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='quick', help='参数规模')
+    parser.add_argument('--only', nargs='*', choices=['startup', 'query', 'render', 'session'],
+                        help='只运行指定的场景')
+    parser.add_argument('--latency', type=float, default=0.0, help='模拟服务器每个请求的延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='模拟服务器额外的随机延迟上限（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='模拟服务器返回错误的概率')
+    parser.add_argument('--output', default='benchmark_results.json', help='结果文件')
+    parser.add_argument('--baseline', help='用于比较的基线结果文件')
+    parser.add_argument('--threshold', type=float, default=0.1, help='p50 变慢超过该比例时视为退化')
+    args = parser.parse_args()
+
+    # 模拟数据中缺少中文字体时 matplotlib 会反复输出警告，与测量无关
+    logging.getLogger('matplotlib.font_manager').setLevel(logging.ERROR)
+    scenarios = args.only or ['startup', 'query', 'render', 'session']
+    work_dir = tempfile.mkdtemp(prefix='imf-bench-')
+    try:
+        with MockServerProcess(args.latency, args.jitter, args.error_rate) as server:
+            benchmark = Benchmark(server, SCALES[args.scale], work_dir)
+            for scenario in scenarios:
+                getattr(benchmark, f'bench_{scenario}s' if scenario == 'session' else f'bench_{scenario}')()
+            server_stats = server.stats()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = {
+        'meta': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'scale': args.scale,
+            'latency': args.latency,
+            'jitter': args.jitter,
+            'error_rate': args.error_rate,
+            'server': server_stats,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': benchmark.results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f"结果已保存到 {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        if compare(benchmark.results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import re
+from types import MappingProxyType
+
+_TOKEN_RE = re.compile(r'[0-9a-z]+')
+
+
+def _tokens(text):
+    """将代码或英文名称拆分为小写词元"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+class CatalogIndex:
+    """
+    指标或国家/地区目录的不可变索引，启动时构建一次，所有会话共享
+    包含预先生成的下拉选项、代码和名称（英文 label 以及可选的中文 label_zh）的前缀索引，
+    以及按分组字段（如指标的 dataset）归类的代码列表
+    """
+    def __init__(self, catalog, group_field=None):
+        """
+        :param catalog: 目录字典 {code: {'label': ..., 'label_zh': ..., ...}}
+        :param group_field: 分组字段名 (如: 'dataset')，为 None 时不分组
+        """
+        codes = tuple(catalog)
+        self.codes = codes
+        self.labels = MappingProxyType({code: catalog[code].get('label') or code for code in codes})
+        self._zh_labels = tuple((i, catalog[code]['label_zh']) for i, code in enumerate(codes) if catalog[code].get('label_zh'))
+        # 预先生成的选项，所有会话直接复用
+        self.options = tuple({'label': self.labels[code], 'value': code} for code in codes)
+        self._position = MappingProxyType({code: i for i, code in enumerate(codes)})
+
+        prefix_index = dict()
+        for i, code in enumerate(codes):
+            for token in set(_tokens(code) + _tokens(self.labels[code])):
+                for end in range(1, len(token) + 1):
+                    prefix_index.setdefault(token[:end], set()).add(i)
+        self._prefix_index = MappingProxyType({prefix: frozenset(ids) for prefix, ids in prefix_index.items()})
+
+        groups = dict()
+        if group_field:
+            for code in codes:
+                groups.setdefault(catalog[code].get(group_field) or '其他', []).append(code)
+        self.groups = MappingProxyType({group: tuple(members) for group, members in groups.items()})
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code):
+        return code in self._position
+
+    def search(self, query, limit=50, group=None):
+        """
+        按代码或名称搜索
+        :param query: 搜索词，多个词之间为“与”关系，每个词按前缀匹配；非ASCII字符按中文名称子串匹配
+        :param limit: 最多返回的条目数
+        :param group: 只在指定分组中搜索
+        :return: 代码列表，代码完全匹配的排在最前，其余按目录顺序
+        """
+        query = query.strip()
+        members = None
+        if group is not None:
+            members = {self._position[code] for code in self.groups.get(group, ())}
+        if not query:
+            ids = sorted(members) if members is not None else range(len(self.codes))
+            return [self.codes[i] for i in list(ids)[:limit]]
+
+        tokens = _tokens(query)
+        if tokens:
+            ids = None
+            for token in tokens:
+                matched = self._prefix_index.get(token, frozenset())
+                ids = matched if ids is None else ids & matched
+                if not ids:
+                    break
+        else:
+            ids = frozenset(i for i, label in self._zh_labels if query in label)
+        if members is not None:
+            ids = ids & members
+        exact = self._position.get(query.upper())
+        ranked = sorted(ids, key=lambda i: (i != exact, i))
+        return [self.codes[i] for i in ranked[:limit]]
+
+    def options_for(self, query='', selected=(), limit=50):
+        """
+        生成下拉选项：已选中的条目始终保留在最前，其后为搜索结果
+        :param query: 搜索词
+        :param selected: 已选中的代码列表
+        :param limit: 搜索结果最多返回的条目数
+        :return: 选项列表 [{'label': ..., 'value': ...}]
+        """
+        selected = [code for code in selected if code in self._position]
+        chosen = set(selected)
+        codes = selected + [code for code in self.search(query, limit) if code not in chosen]
+        return [self.options[self._position[code]] for code in codes]
@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# 目录文件的默认位置：本模块目录下的 cache/catalog，可通过环境变量 IMF_CATALOG_DIR 修改
+DEFAULT_CATALOG_DIR = os.environ.get('IMF_CATALOG_DIR') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'cache', 'catalog')
+# 仓库中随代码提供的目录文件，只读，本地还没有目录文件时作为初始目录
+SEED_CATALOG_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def atomic_write_json(path, data):
+    """
+    原子写入JSON文件：先写入同目录下的临时文件并刷盘，再替换目标文件
+    :param path: 目标文件路径
+    :param data: 可JSON序列化的对象
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class CatalogStore:
+    """
+    指标和国家/地区目录的本地存储
+    目录文件位于固定目录，写入是原子的，每次内容变化版本号加一（记录在 catalog_meta.json 中），
+    刷新时使用条件请求（ETag / Last-Modified），并比较内容哈希，只有内容变化才写入；
+    目录中还没有文件时读取只读的初始目录（不会被写入）
+    """
+    # 目录名 -> (文件名, API路径, 响应中的键)
+    CATALOGS = {
+        'indicators': ('available_indicators.json', '/indicators', 'indicators'),
+        'entities': ('available_entities.json', '/countries', 'countries'),
+    }
+    META_FILE = 'catalog_meta.json'
+
+    def __init__(self, client, directory=None, seed_directory=SEED_CATALOG_DIR):
+        """
+        :param client: ImfClient
+        :param directory: 目录文件所在目录，默认为 DEFAULT_CATALOG_DIR
+        :param seed_directory: 初始目录文件所在目录，为 None 时没有初始目录
+        """
+        self.client = client
+        self.directory = directory or DEFAULT_CATALOG_DIR
+        self.seed_directory = seed_directory
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def path(self, name):
+        return os.path.join(self.directory, self.CATALOGS[name][0])
+
+    def read_meta(self):
+        """
+        读取版本信息
+        :return: {name: {'version', 'sha256', 'etag', 'last_modified', 'updated_at'}}
+        """
+        try:
+            with open(os.path.join(self.directory, self.META_FILE), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def version(self, name):
+        """目录的当前版本号，没有记录时为 0"""
+        return self.read_meta().get(name, {}).get('version', 0)
+
+    def load(self, name):
+        """
+        读取本地目录文件，还没有文件时读取初始目录
+        :return: 目录字典，文件不存在或损坏时返回 None
+        """
+        paths = [self.path(name)]
+        if self.seed_directory:
+            paths.append(os.path.join(self.seed_directory, self.CATALOGS[name][0]))
+        for path in paths:
+            try:
+                with open(path, 'r') as f:
+                    return json.load(f)
+            except FileNotFoundError:
+                continue
+            except ValueError:
+                print(f"文件 {path} 已损坏")
+                return None
+        return None
+
+    @staticmethod
+    def digest(data):
+        return hashlib.sha256(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def save(self, name, data, etag=None, last_modified=None):
+        """
+        原子写入目录文件并更新版本信息
+        :return: 新版本号
+        """
+        with self._lock:
+            atomic_write_json(self.path(name), data)
+            meta = self.read_meta()
+            entry = meta.get(name, {})
+            meta[name] = {
+                'version': entry.get('version', 0) + 1,
+                'sha256': self.digest(data),
+                'etag': etag,
+                'last_modified': last_modified,
+                'updated_at': time.time(),
+            }
+            atomic_write_json(os.path.join(self.directory, self.META_FILE), meta)
+            return meta[name]['version']
+
+    def refresh(self, name):
+        """
+        向API发起条件请求，内容变化时写入新版本
+        :return: 内容变化时返回新的目录字典，否则返回 None
+        """
+        _, api_path, key = self.CATALOGS[name]
+        entry = self.read_meta().get(name, {})
+        headers = dict()
+        if os.path.exists(self.path(name)):
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        response = self.client.get(api_path, headers=headers)
+        if response.status_code == 304:
+            return None
+        data = response.json()[key]
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if data == self.load(name):
+            # 内容没有变化，只记录新的校验信息；内容来自初始目录时写入本地，之后可以使用条件请求
+            with self._lock:
+                if not os.path.exists(self.path(name)):
+                    atomic_write_json(self.path(name), data)
+                meta = self.read_meta()
+                meta.setdefault(name, {'version': 1, 'sha256': self.digest(data)})
+                meta[name].update(etag=etag, last_modified=last_modified, updated_at=time.time())
+                atomic_write_json(os.path.join(self.directory, self.META_FILE), meta)
+            return None
+        self.save(name, data, etag, last_modified)
+        return data
+
+
+class CatalogRefresher(threading.Thread):
+    """
+    后台刷新目录的守护线程
+    每隔 interval 秒检查一次：fetch_remote 为真时向API发起条件请求，
+    然后检查本地版本号，发现新版本（包括其他进程写入的）时调用 on_update 替换内存中的目录
+    """
+    def __init__(self, store, on_update, interval=6 * 3600, initial_delay=10, fetch_remote=True):
+        """
+        :param store: CatalogStore
+        :param on_update: 回调 on_update(name, data)
+        :param interval: 检查间隔（秒）
+        :param initial_delay: 启动后第一次检查前的等待时间（秒）
+        :param fetch_remote: 是否向API请求，为 False 时只检查本地文件
+        """
+        super().__init__(name='catalog-refresher', daemon=True)
+        self.store = store
+        self.on_update = on_update
+        self.interval = interval
+        self.initial_delay = initial_delay
+        self.fetch_remote = fetch_remote
+        self._versions = {name: store.version(name) for name in store.CATALOGS}
+        self._stop_event = threading.Event()
+
+    def run(self):
+        delay = self.initial_delay
+        while not self._stop_event.wait(delay):
+            delay = self.interval
+            for name in self.store.CATALOGS:
+                try:
+                    self.check(name)
+                except Exception as e:
+                    print(f"刷新目录 {name} 失败: {e}")
+
+    def check(self, name):
+        """
+        检查单个目录，有新版本时调用 on_update
+        """
+        if self.fetch_remote:
+            self.store.refresh(name)
+        version = self.store.version(name)
+        if version != self._versions.get(name):
+            data = self.store.load(name)
+            if data:
+                self.on_update(name, data)
+                self._versions[name] = version
+
+    def stop(self):
+        self._stop_event.set()
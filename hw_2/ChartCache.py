@@ -0,0 +1,172 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from Metrics import CACHE_REQUESTS
+
+
+class ChartCache:
+    """
+    已渲染图表的内容寻址缓存
+    内存中按LRU淘汰，总大小不超过 max_bytes；配置了 spill_dir 时，被淘汰的图表写入磁盘，
+    磁盘部分同样按最久未使用淘汰，总大小不超过 spill_max_bytes
+    多进程运行时开启 write_through，图表写入时立即落盘，其他进程在内存未命中时从磁盘读取
+    磁盘部分的总大小在本进程中累计估计，超出上限或距上次检查超过 SPILL_CHECK_INTERVAL 秒时才扫描目录，
+    淘汰到上限的 SPILL_LOW_WATER 倍，避免每次写入都扫描（其他进程的写入在下次扫描时计入）
+    """
+    SPILL_CHECK_INTERVAL = 60
+    SPILL_LOW_WATER = 0.9
+
+    def __init__(self, max_bytes=64 * 2 ** 20, spill_dir=None, spill_max_bytes=256 * 2 ** 20, write_through=False):
+        """
+        :param max_bytes: 内存缓存的字节上限
+        :param spill_dir: 磁盘溢出目录，为 None 时不写磁盘
+        :param spill_max_bytes: 磁盘溢出目录的字节上限
+        :param write_through: 写入时是否同时写入磁盘（与其他进程共享）
+        """
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = spill_max_bytes
+        self.write_through = write_through
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # 磁盘部分总大小的估计值（None 表示尚未扫描）和上次扫描的时间
+        self._spill_bytes = None
+        self._spill_checked = 0.0
+        self._spill_lock = threading.Lock()
+        if spill_dir and not os.path.exists(spill_dir):
+            os.makedirs(spill_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts):
+        """
+        由若干部分计算缓存键（sha256），bytes 直接参与哈希，其他对象使用 repr
+        :return: 十六进制字符串
+        """
+        digest = hashlib.sha256()
+        for part in parts:
+            data = part if isinstance(part, bytes) else repr(part).encode('utf-8')
+            digest.update(len(data).to_bytes(8, 'little'))
+            digest.update(data)
+        return digest.hexdigest()
+
+    @property
+    def memory_bytes(self):
+        """内存中缓存的总字节数"""
+        return self._bytes
+
+    def get(self, key):
+        """
+        读取缓存
+        :param key: 缓存键
+        :return: 二进制图像数据，未命中时返回 None
+        """
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+        if data is not None:
+            CACHE_REQUESTS.inc(cache='chart', result='hit', tier='memory')
+            return data
+        data = self._read_spilled(key)
+        if data is not None:
+            CACHE_REQUESTS.inc(cache='chart', result='hit', tier='disk')
+            self.put(key, data)
+        else:
+            CACHE_REQUESTS.inc(cache='chart', result='miss')
+        return data
+
+    def put(self, key, data):
+        """
+        写入缓存
+        :param key: 缓存键
+        :param data: 二进制图像数据
+        """
+        if len(data) > self.max_bytes:
+            self._spill(key, data)
+            return
+        if self.write_through:
+            self._spill(key, data)
+        evicted = []
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._items[key] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                old_key, old_data = self._items.popitem(last=False)
+                self._bytes -= len(old_data)
+                evicted.append((old_key, old_data))
+        for old_key, old_data in evicted:
+            self._spill(old_key, old_data)
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, key + '.bin')
+
+    def _spill(self, key, data):
+        """
+        将图表写入磁盘（原子写入），并按修改时间淘汰超出上限的文件
+        """
+        if not self.spill_dir:
+            return
+        path = self._spill_path(key)
+        if os.path.exists(path):
+            return
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._spill_lock:
+            if self._spill_bytes is not None:
+                self._spill_bytes += len(data)
+            due = self._spill_bytes is None or self._spill_bytes > self.spill_max_bytes or \
+                time.monotonic() - self._spill_checked > self.SPILL_CHECK_INTERVAL
+        if due:
+            self._trim_spill_dir()
+
+    def _read_spilled(self, key):
+        if not self.spill_dir:
+            return None
+        path = self._spill_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        # 更新修改时间，作为磁盘部分的LRU依据
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return data
+
+    def _trim_spill_dir(self):
+        """
+        扫描磁盘溢出目录，超出上限时按修改时间淘汰到 spill_max_bytes * SPILL_LOW_WATER，并更新总大小的估计值
+        """
+        entries = []
+        total = 0
+        for entry in os.scandir(self.spill_dir):
+            if entry.name.endswith('.bin'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        if total > self.spill_max_bytes:
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.spill_max_bytes * self.SPILL_LOW_WATER:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+        with self._spill_lock:
+            self._spill_bytes = total
+            self._spill_checked = time.monotonic()
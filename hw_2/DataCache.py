@@ -0,0 +1,169 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class ObservationCache:
+    """
+    IMF观测值的本地磁盘缓存（SQLite），以 (指标, 国家/地区, 年份) 为键
+    值为 None 的单元格表示上游确认没有数据（负缓存），同样不会再次请求
+    读取时不写数据库：命中的单元格的访问时间先记录在内存中，在写入时或每隔 touch_interval 秒批量写回，
+    多个进程共享数据库时读取不会互相阻塞
+    """
+    def __init__(self, path, ttl=24 * 3600, max_cells=200000, touch_interval=60):
+        """
+        初始化缓存
+        :param path: SQLite文件路径
+        :param ttl: 缓存有效期（秒），超过有效期的单元格视为缺失
+        :param max_cells: 最多保留的单元格数，超出后按最近访问时间淘汰
+        :param touch_interval: 访问时间写回数据库的最长间隔（秒）
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_cells = max_cells
+        self.touch_interval = touch_interval
+        cache_dir = os.path.dirname(path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._listeners = []
+        # 尚未写回的访问时间 {(indicator, entity, year): accessed_at}
+        self._touched = dict()
+        self._touch_flushed = time.time()
+        # 多个工作进程共享同一数据库文件：写锁被占用时等待而不是立即报错
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS observations ("
+            " indicator TEXT NOT NULL,"
+            " entity TEXT NOT NULL,"
+            " year INTEGER NOT NULL,"
+            " value REAL,"
+            " fetched_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (indicator, entity, year))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_observations_accessed ON observations (accessed_at)"
+        )
+
+    def get_cells(self, indicator, entities, years, allow_stale=False):
+        """
+        读取缓存中的单元格
+        :param indicator: 指标ID
+        :param entities: 国家/地区代码列表
+        :param years: 年份列表
+        :param allow_stale: 是否返回已过期的单元格（上游不可用时使用）
+        :return: 字典 {(entity, year): value}，不包含缺失或过期的单元格
+        """
+        if not entities or not years:
+            return {}
+        now = time.time()
+        min_fetched = float('-inf') if allow_stale else now - self.ttl
+        entity_marks = ','.join('?' * len(entities))
+        sql = (
+            "SELECT entity, year, value FROM observations"
+            f" WHERE indicator = ? AND entity IN ({entity_marks})"
+            " AND year BETWEEN ? AND ? AND fetched_at >= ?"
+        )
+        wanted_years = set(years)
+        with self._lock:
+            rows = self._conn.execute(
+                sql, [indicator, *entities, min(years), max(years), min_fetched]
+            ).fetchall()
+            cells = {(entity, year): value for entity, year, value in rows if year in wanted_years}
+            for entity, year in cells:
+                self._touched[(indicator, entity, year)] = now
+            if self._touched and now - self._touch_flushed > self.touch_interval:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._flush_touches()
+                    self._conn.execute("COMMIT")
+                except sqlite3.Error:
+                    self._conn.execute("ROLLBACK")
+                    raise
+        return cells
+
+    def put_cells(self, indicator, cells):
+        """
+        写入单元格
+        :param indicator: 指标ID
+        :param cells: 可迭代对象，元素为 (entity, year, value)，value 为 None 表示没有数据
+        """
+        now = time.time()
+        rows = [(indicator, entity, int(year), value, now, now) for entity, year, value in cells]
+        if not rows:
+            return
+        with self._lock:
+            # 事务开始时即获取写锁，避免多个进程同时由读锁升级时出现 SQLITE_BUSY
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 先写回访问时间，淘汰时按最新的访问时间排序
+                self._flush_touches()
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO observations"
+                    " (indicator, entity, year, value, fetched_at, accessed_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._evict()
+        years = {row[2] for row in rows}
+        for listener in list(self._listeners):
+            listener(indicator, years)
+
+    def add_listener(self, listener):
+        """
+        注册写入回调，每次 put_cells 提交后调用（在写入的线程中）
+        :param listener: 函数 listener(indicator, years)，years 为写入的年份集合
+        """
+        self._listeners.append(listener)
+
+    def _flush_touches(self):
+        """
+        将内存中记录的访问时间写回数据库，调用方需持有锁并已开始事务
+        """
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE observations SET accessed_at = ? WHERE indicator = ? AND entity = ? AND year = ?",
+                [(accessed_at, indicator, entity, year) for (indicator, entity, year), accessed_at in self._touched.items()],
+            )
+            self._touched.clear()
+        self._touch_flushed = time.time()
+
+    def _evict(self):
+        """
+        淘汰超出容量的单元格（最久未访问的优先），调用方需持有锁
+        """
+        count = self._conn.execute("SELECT COUNT(*) FROM observations").fetchone()[0]
+        overflow = count - self.max_cells
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM observations WHERE rowid IN"
+                " (SELECT rowid FROM observations ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+
+    def purge_expired(self):
+        """
+        删除所有过期的单元格
+        :return: 删除的单元格数
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM observations WHERE fetched_at < ?", (time.time() - self.ttl,)
+            )
+        return cursor.rowcount
+
+    def close(self):
+        """写回访问时间并关闭数据库连接"""
+        with self._lock:
+            if self._touched:
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._flush_touches()
+                self._conn.execute("COMMIT")
+            self._conn.close()
@@ -1,29 +1,74 @@
 import requests
+import numpy as np
 import json
+import csv
+import io
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from DataCache import ObservationCache
+from DataMatrix import ResultMatrix
+from HttpClient import get_default_client
+from CatalogIndex import CatalogIndex
+from CatalogStore import CatalogStore, CatalogRefresher, SEED_CATALOG_DIR, atomic_write_json
+from SingleFlight import SingleFlight
+from Metrics import STAGE_SECONDS, CACHE_REQUESTS, PAYLOAD_BYTES
+from DerivedIndicators import DerivedEngine
+from Snapshot import SnapshotStore
+from StreamParser import parse_values_stream
 class BasicInfoManager:
-    def __init__(self):
-        self.base_url = 'https://www.imf.org/external/datamapper/api/v1'
-        cwd = os.getcwd()  # 获取当前工作路径
-        cwd = os.getcwd()  # 获取当前工作路径
-        json_dir = os.path.join(cwd, 'hw_2')
-        if not os.path.exists(json_dir):
-            os.makedirs(json_dir)
-        indicators_path = os.path.join(json_dir, 'available_indicators.json')
-        entities_path = os.path.join(json_dir, 'available_entities.json')
-        if not os.path.exists(indicators_path):
-            self.available_indicators = self.get_available_indicators()
-            self.save_available_indicators(indicators_path)
-        else:
-            self.available_indicators = self.read_available_indicators(indicators_path)
-        if not os.path.exists(entities_path):
-            self.available_entities = self.get_available_entities()
-            self.save_available_entities(entities_path)
-        else:
-            self.available_entities = self.read_available_entities(entities_path)
-        if self.available_indicators is None or self.available_entities is None:
+    def __init__(self, client=None, catalog_dir=None, derived_engine=None, catalog_seed_dir=SEED_CATALOG_DIR):
+        """
+        初始化基本信息管理器，目录总是从本地文件读取，只有本地没有文件时才阻塞请求API
+        :param client: 共享的 ImfClient，默认使用 get_default_client()
+        :param catalog_dir: 目录文件所在目录，默认为本模块目录下的 cache/catalog（可用环境变量 IMF_CATALOG_DIR 修改）
+        :param derived_engine: 派生指标引擎（DerivedEngine），其中的派生指标加入指标目录
+        :param catalog_seed_dir: 只读的初始目录文件所在目录（默认为仓库中的目录文件），为 None 时没有初始目录
+        """
+        self.derived_engine = derived_engine or DerivedEngine()
+        self.client = client or get_default_client()
+        self.base_url = self.client.base_url
+        self.catalog_store = CatalogStore(self.client, catalog_dir, catalog_seed_dir)
+        self.refresher = None
+        catalogs = dict()
+        for name in CatalogStore.CATALOGS:
+            catalogs[name] = self.catalog_store.load(name)
+            if catalogs[name] is None:
+                try:
+                    catalogs[name] = self.catalog_store.refresh(name)
+                except requests.exceptions.RequestException as e:
+                    print(f"请求错误: {e}")
+        if catalogs['indicators'] is None or catalogs['entities'] is None:
             raise ValueError("无法获取可用指标或国家/地区信息")
-            
+        self._apply_catalog('indicators', catalogs['indicators'])
+        self._apply_catalog('entities', catalogs['entities'])
+
+    def _apply_catalog(self, name, data):
+        """
+        构建目录索引后整体替换，正在使用旧目录的会话不受影响
+        :param name: 'indicators' 或 'entities'
+        :param data: 目录字典
+        """
+        if name == 'indicators':
+            # 派生指标作为伪指标加入目录，可以和原始指标一样选择和搜索
+            data = dict(data, **self.derived_engine.catalog(data))
+            # 目录索引只构建一次，供所有会话的下拉选项和搜索使用
+            index = CatalogIndex(data, group_field='dataset')
+            self.available_indicators, self.indicator_index = data, index
+        else:
+            index = CatalogIndex(data, group_field='region')
+            self.available_entities, self.entity_index = data, index
+
+    def start_refresher(self, interval=6 * 3600, fetch_remote=True):
+        """
+        启动后台目录刷新线程
+        :param interval: 检查间隔（秒）
+        :param fetch_remote: 是否向API发起请求，为 False 时只加载其他进程写入的新版本
+        """
+        if self.refresher is None:
+            self.refresher = CatalogRefresher(self.catalog_store, self._apply_catalog, interval=interval,
+                                              fetch_remote=fetch_remote)
+            self.refresher.start()
         
     def get_available_indicators(self):
         """
@@ -31,7 +76,7 @@ class BasicInfoManager:
         :return: 可用指标（字典）
         """
         try:
-            response = requests.get(self.base_url + '/indicators')
+            response = self.client.get('/indicators')
             response.raise_for_status()
             data = response.json()
             return data['indicators']
@@ -45,8 +90,9 @@ class BasicInfoManager:
         :param filename: 文件名
         """
         if self.available_indicators:
-            with open(filename, 'w') as f:
-                json.dump(self.available_indicators, f)
+            # 派生指标不属于IMF目录，不写入文件
+            atomic_write_json(filename, {code: info for code, info in self.available_indicators.items()
+                                         if not self.derived_engine.is_derived(code)})
             print(f"可用指标已保存到 {filename}")
         else:
             print("无法获取可用指标")
@@ -72,7 +118,7 @@ class BasicInfoManager:
         :return: 可用国家/地区（字典）
         """
         try:
-            response = requests.get(self.base_url + '/countries')
+            response = self.client.get('/countries')
             response.raise_for_status()
             data = response.json()
             return data['countries']
@@ -86,8 +132,7 @@ class BasicInfoManager:
         :param filename: 文件名
         """
         if self.available_entities:
-            with open(filename, 'w') as f:
-                json.dump(self.available_entities, f)
+            atomic_write_json(filename, self.available_entities)
             print(f"可用国家/地区已保存到 {filename}")
         else:
             print("无法获取可用国家/地区")
@@ -107,8 +152,41 @@ class BasicInfoManager:
         return entities
         
 class DataManager:
-    def __init__(self):
-        self.base_url = 'https://www.imf.org/external/datamapper/api/v1'
+    # IMF datamapper 接受的URL长度上限（保守估计）
+    MAX_URL_LENGTH = 2000
+
+    def __init__(self, cache_path=None, cache_ttl=24 * 3600, cache_max_cells=200000, max_concurrent_requests=4,
+                 client=None, fetch_timeout=60, derived_engine=None, snapshot=None, offline=None):
+        """
+        初始化数据管理器
+        :param cache_path: 观测值缓存文件路径，默认为本模块目录下的 cache/observations.sqlite3
+        :param cache_ttl: 缓存有效期（秒）
+        :param cache_max_cells: 缓存最多保留的单元格数
+        :param max_concurrent_requests: 异步查询时同时进行的最大请求数
+        :param client: 共享的 ImfClient，默认使用 get_default_client()
+        :param fetch_timeout: 等待其他会话发起的相同请求的超时时间（秒）
+        :param derived_engine: 派生指标引擎（DerivedEngine），查询中的派生指标由其计算
+        :param snapshot: 离线快照（SnapshotStore），默认打开 DEFAULT_SNAPSHOT_DIR 中已有的快照；
+                         在线模式下上游不可用时用于补齐缺失的数据
+        :param offline: 离线模式，全部查询由快照回答，不发起任何网络请求；默认由环境变量 IMF_OFFLINE=1 开启
+        :raise FileNotFoundError: 离线模式下没有可用的快照
+        """
+        self.derived_engine = derived_engine or DerivedEngine()
+        if snapshot is None and SnapshotStore.exists():
+            snapshot = SnapshotStore()
+        self.snapshot = snapshot
+        self.offline = os.environ.get('IMF_OFFLINE') == '1' if offline is None else offline
+        if self.offline and self.snapshot is None:
+            raise FileNotFoundError("离线模式需要快照，请先运行 python Snapshot.py build")
+        self.client = client or get_default_client()
+        self.base_url = self.client.base_url
+        if cache_path is None:
+            cache_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'observations.sqlite3')
+        self.cache = ObservationCache(cache_path, ttl=cache_ttl, max_cells=cache_max_cells)
+        self.fetch_executor = ThreadPoolExecutor(max_workers=max_concurrent_requests, thread_name_prefix='imf-fetch')
+        # 多个会话同时请求相同批次时只发起一次请求
+        self.fetch_timeout = fetch_timeout
+        self.fetch_flights = SingleFlight('fetch')
     
     def query_params_check(self, basic_info_manager, indicator, entities, years):
         """
@@ -131,49 +209,303 @@ class DataManager:
     
     def query_data(self, indicator, entities, years):
         """
-        从IMF API获取数据(仅限单个指标)
+        获取数据(仅限单个指标)，优先读取本地缓存，只向IMF API请求缺失的单元格
         :param indicator: 指标ID如: 'NGDP_RPCH'
         :param entities: 国家/地区代码列表 (如: ['USA', 'CHN'])
         :param years: 年份范围 (如: [2019, 2020])
         :return: 解析后的数据字典，三层嵌套结构，第一层为指标，第二层为国家/地区，第三层为年份和对应的值，年份和值都是列表。
         """
-        base_url = self.base_url
+        return self.query_many([indicator], entities, years)
+
+    def query_many(self, indicators, entities, years):
+        """
+        获取多个指标的数据，缺失的单元格合并为尽量少的请求（受URL长度限制）
+        :param indicators: 指标ID列表 (如: ['NGDP_RPCH', 'LP'])
+        :param entities: 国家/地区代码列表 (如: ['USA', 'CHN'])
+        :param years: 年份范围 (如: [2019, 2020])
+        :return: 解析后的数据字典，结构同 query_data，每个指标各占第一层的一个键
+        """
+        return self.query_matrix(indicators, entities, years).to_dict()
+
+    async def query_many_async(self, indicators, entities, years):
+        """
+        query_many 的非阻塞版本
+        :return: 解析后的数据字典，结构同 query_many
+        """
+        return (await self.query_matrix_async(indicators, entities, years)).to_dict()
+
+    def query_matrix(self, indicators, entities, years):
+        """
+        获取多个指标的数据，以稠密矩阵形式返回
+        :param indicators: 指标ID列表 (如: ['NGDP_RPCH', 'LP'])
+        :param entities: 国家/地区代码列表 (如: ['USA', 'CHN'])
+        :param years: 年份范围 (如: [2019, 2020])
+        :return: ResultMatrix，形状为 指标 × 国家/地区 × 年份
+        """
+        if any(self.derived_engine.is_derived(indicator) for indicator in indicators):
+            # 派生指标：查询其依赖的原始指标（经由缓存）后计算
+            raw_indicators, query_years = self.derived_engine.plan(indicators, years)
+            matrix = self.query_matrix(raw_indicators, entities, query_years)
+            return self.derived_engine.evaluate(matrix, indicators, years)
+        with STAGE_SECONDS.time(stage='query'):
+            if self.offline:
+                return self._query_snapshot(indicators, entities, years)
+            cells, plans = self._lookup(indicators, entities, years)
+            try:
+                for indicator_chunk, entity_chunk, request_years in plans:
+                    self._fetch_chunk(indicator_chunk, entity_chunk, request_years, cells)
+            except (requests.exceptions.RequestException, TimeoutError) as e:
+                return self._fallback(indicators, entities, years, cells, e)
+            return self._assemble(indicators, entities, years, cells)
+
+    async def query_matrix_async(self, indicators, entities, years):
+        """
+        query_matrix 的非阻塞版本：各批次请求在 fetch_executor 中并发执行，
+        并发数受 max_concurrent_requests 限制（所有会话共享），其他会话正在请求的相同批次直接等待其结果
+        :return: ResultMatrix
+        """
+        if any(self.derived_engine.is_derived(indicator) for indicator in indicators):
+            raw_indicators, query_years = self.derived_engine.plan(indicators, years)
+            matrix = await self.query_matrix_async(raw_indicators, entities, query_years)
+            return self.derived_engine.evaluate(matrix, indicators, years)
+        with STAGE_SECONDS.time(stage='query'):
+            if self.offline:
+                # 快照读取只涉及内存映射中选中的部分，不需要放入线程池
+                return self._query_snapshot(indicators, entities, years)
+            cells, plans = self._lookup(indicators, entities, years)
+            futures = [
+                self.fetch_flights.submit(self._flight_key(indicator_chunk, entity_chunk, request_years), self.fetch_executor,
+                                          self._fetch_and_store, indicator_chunk, entity_chunk, request_years)
+                for indicator_chunk, entity_chunk, request_years in plans
+            ]
+            try:
+                for future in futures:
+                    self._merge(await self.fetch_flights.wait_async(future, self.fetch_timeout), cells)
+            except (requests.exceptions.RequestException, asyncio.TimeoutError) as e:
+                return self._fallback(indicators, entities, years, cells, e)
+            return self._assemble(indicators, entities, years, cells)
+
+    def _fallback(self, indicators, entities, years, cells, error):
+        """
+        上游请求失败时，用已过期的缓存补齐缺失的单元格
+        :param error: 请求异常
+        :return: ResultMatrix，警告中包含请求错误
+        """
+        msg = f"请求错误: {str(error) or type(error).__name__}"
+        print(msg)
+        if not entities or not years:
+            result = ResultMatrix(indicators, [], [])
+            result.warnings.append(msg)
+            result.error = msg
+            return result
+        for indicator in indicators:
+            stale = self.cache.get_cells(indicator, entities, years, allow_stale=True)
+            for key, value in stale.items():
+                cells[indicator].setdefault(key, value)
+        if self.snapshot is not None:
+            # 过期缓存中也没有的单元格由离线快照补齐
+            snapshot = self.snapshot.query(indicators, entities, years)
+            for i, indicator in enumerate(indicators):
+                for e, y in zip(*np.nonzero(snapshot.mask[i])):
+                    cells[indicator].setdefault((snapshot.entities[e], int(snapshot.years[y])), float(snapshot.values[i, e, y]))
+        result = self._assemble(indicators, entities, years, cells)
+        result.warnings[:0] = [msg, "警告: IMF API 不可用，部分数据来自已过期的本地缓存或离线快照"]
+        result.error = msg
+        return result
+
+    def iter_export_csv(self, indicators, entities, years, chunk_size=50):
+        """
+        以CSV格式流式导出数据（长表：indicator, entity, year, value），内存占用只与单个批次有关
+        数据通过 query_matrix 获取，已缓存的单元格不会重复请求
+        :param indicators: 指标ID列表
+        :param entities: 国家/地区代码列表，为空时导出全部国家/地区（按指标分批，不经过缓存；
+                         需要复用缓存时由调用方传入目录中的全部国家/地区）
+        :param years: 年份列表，为空时导出全部年份
+        :param chunk_size: 每批次包含的国家/地区数
+        :return: 生成器，逐块产生UTF-8编码的CSV数据
+        """
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(['indicator', 'entity', 'year', 'value'])
+        if entities:
+            batches = [(indicators, entities[i:i + chunk_size]) for i in range(0, len(entities), chunk_size)]
+        else:
+            batches = [([indicator], []) for indicator in indicators]
+        for batch_indicators, batch_entities in batches:
+            matrix = self.query_matrix(batch_indicators, batch_entities, years)
+            for i, indicator in enumerate(matrix.indicators):
+                for e, y in zip(*np.nonzero(matrix.mask[i])):
+                    writer.writerow([indicator, matrix.entities[e], int(matrix.years[y]), repr(float(matrix.values[i, e, y]))])
+            yield buf.getvalue().encode('utf-8')
+            buf.seek(0)
+            buf.truncate()
+
+    def _lookup(self, indicators, entities, years):
+        """
+        读取缓存并规划需要向API发起的请求
+        :return: (cells, plans)，cells 为 {indicator: {(entity, year): value}}，
+                 plans 为列表，元素为 (指标列表, 国家/地区列表, 年份列表)
+        """
+        # 未指定国家/地区或年份时无法确定需要哪些单元格，全部请求
+        if not entities or not years:
+            cells = {indicator: dict() for indicator in indicators}
+            plans = [(indicator_chunk, [], years) for indicator_chunk, _ in self._plan_requests(indicators, [], years)]
+            return cells, plans
+
+        years = sorted(years)
+        cells = {indicator: self.cache.get_cells(indicator, entities, years) for indicator in indicators}
+        hits = sum(len(indicator_cells) for indicator_cells in cells.values())
+        CACHE_REQUESTS.inc(hits, cache='observations', result='hit', tier='disk')
+        CACHE_REQUESTS.inc(len(indicators) * len(entities) * len(years) - hits, cache='observations', result='miss')
+        missing_indicators = []
+        missing_entities = set()
+        missing_years = set()
+        for indicator in indicators:
+            indicator_cells = cells[indicator]
+            for entity in entities:
+                entity_missing = [year for year in years if (entity, year) not in indicator_cells]
+                if entity_missing:
+                    missing_entities.add(entity)
+                    missing_years.update(entity_missing)
+                    if not missing_indicators or missing_indicators[-1] != indicator:
+                        missing_indicators.append(indicator)
+        if not missing_indicators:
+            return cells, []
+        missing_entities = [entity for entity in entities if entity in missing_entities]
+        missing_years = sorted(missing_years)
+        plans = [(indicator_chunk, entity_chunk, missing_years)
+                 for indicator_chunk, entity_chunk in self._plan_requests(missing_indicators, missing_entities, missing_years)]
+        return cells, plans
+
+    def _fetch_chunk(self, indicators, entities, years, cells):
+        """
+        请求一个批次（与其他会话的相同批次合并），合并到 cells 中
+        :param cells: {indicator: {(entity, year): value}}，就地更新
+        """
+        fetched = self.fetch_flights.do(self._flight_key(indicators, entities, years), self._fetch_and_store,
+                                        indicators, entities, years, timeout=self.fetch_timeout)
+        self._merge(fetched, cells)
+
+    @staticmethod
+    def _flight_key(indicators, entities, years):
+        return tuple(indicators), tuple(entities), tuple(years)
+
+    def _fetch_and_store(self, indicators, entities, years):
+        """
+        请求一个批次并写入缓存
+        :return: {indicator: {(entity, year): value}}
+        """
+        values = self._fetch_values(indicators, entities, years)
+        result = dict()
+        for indicator in indicators:
+            if entities and years:
+                # 请求了但没有返回的单元格记为没有数据
+                fetched = dict(((entity, year), None) for entity in entities for year in years)
+            else:
+                fetched = dict()
+            if indicator in values:
+                fetched.update(((entity, year), value) for entity, year, value in values[indicator].cells())
+            self.cache.put_cells(indicator, ((entity, year, value) for (entity, year), value in fetched.items()))
+            result[indicator] = fetched
+        return result
+
+    @staticmethod
+    def _merge(fetched, cells):
+        """
+        将请求结果合并到 cells 中，已有的单元格不覆盖
+        """
+        for indicator, indicator_cells in fetched.items():
+            for key, value in indicator_cells.items():
+                cells[indicator].setdefault(key, value)
+
+    def _assemble(self, indicators, entities, years, cells):
+        """
+        由单元格组装结果矩阵，并为没有数据的国家/地区生成警告
+        :return: ResultMatrix
+        """
+        result = ResultMatrix.from_cells(indicators, cells, entities=entities, years=years)
+        if entities and years:
+            self._warn_missing(result)
+        return result
+
+    def _query_snapshot(self, indicators, entities, years):
+        """
+        离线模式：由快照回答查询，快照被刷新后自动重新映射
+        :return: ResultMatrix
+        """
+        self.snapshot.reload_if_changed()
+        result = self.snapshot.query(indicators, entities, years)
+        if entities:
+            self._warn_missing(result)
+        return result
+
+    @staticmethod
+    def _warn_missing(result):
+        """
+        为没有数据的国家/地区生成警告
+        """
+        for i, indicator in enumerate(result.indicators):
+            for e in np.flatnonzero(~result.mask[i].any(axis=1)):
+                msg=f"警告: {result.entities[e]} 在指标 {indicator} 中没有数据"
+                print(msg)
+                result.warnings.append(msg)
+
+    def _plan_requests(self, indicators, entities, years):
+        """
+        将指标和国家/地区拆分为若干批次，使每个请求的URL长度不超过 MAX_URL_LENGTH
+        :return: 列表，元素为 (指标列表, 国家/地区列表)
+        """
+        # 年份参数中的逗号会被编码为 %2C
+        fixed = len(self.base_url) + (len('?periods=') + sum(len(str(year)) + 3 for year in years) if years else 0)
+        budget = self.MAX_URL_LENGTH - fixed
+
+        def split(codes, limit):
+            chunks, chunk, size = [], [], 0
+            for code in codes:
+                if chunk and size + len(code) + 1 > limit:
+                    chunks.append(chunk)
+                    chunk, size = [], 0
+                chunk.append(code)
+                size += len(code) + 1
+            if chunk:
+                chunks.append(chunk)
+            return chunks
+
+        entity_size = sum(len(entity) + 1 for entity in entities)
+        longest_indicator = max(len(indicator) + 1 for indicator in indicators)
+        if entity_size + longest_indicator <= budget:
+            # 所有国家/地区放在一个请求中，剩余长度用于合并指标
+            return [(chunk, list(entities)) for chunk in split(indicators, budget - entity_size)]
+        # 国家/地区过多时，每个指标单独请求，并拆分国家/地区
+        return [([indicator], chunk) for indicator in indicators
+                for chunk in split(entities, budget - len(indicator) - 1)]
+
+    def _fetch_values(self, indicators, entities, years):
+        """
+        向IMF API发起请求
+        :param indicators: 指标ID列表
+        :param entities: 国家/地区代码列表，为空时请求全部国家/地区
+        :param years: 年份列表，为空时请求全部年份
+        :return: {indicator: IndicatorArrays}，只包含请求的国家/地区和年份
+        """
+        path = ''
 
         # 若提供了指标，则将其添加到URL中
-        if indicator:
-            base_url += f"/{indicator}"
+        if indicators:
+            path += '/' + '/'.join(indicators)
         # 若提供了国家/地区代码，则将其添加到URL中
         if entities:
-            base_url += '/' + '/'.join(entities)
+            path += '/' + '/'.join(entities)
 
         # 若提供了年份范围，则将其添加为查询参数，使用逗号分隔
         params = {'periods': ','.join(map(str, years))} if years else None
-        
-        warnings = []
-        try:
-            response = requests.get(base_url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            result = dict()
-            for indicator, entities in data['values'].items():
-                result[indicator] = dict()
-                for entity, entity_data in entities.items():
-                    result[indicator][entity] = dict()
-                    # 获取年份和对应的值
-                    years = list(entity_data.keys())
-                    values = [entity_data[year] for year in years]
-                    years = list(map(int, years))
-                    #如果没有数据，则跳过
-                    if not years or not values:
-                        msg=f"警告: {entity} 在指标 {indicator} 中没有数据"
-                        print(msg)
-                        warnings.append(msg)
-                        continue
-                    result[indicator][entity]['years'] = years
-                    result[indicator][entity]['values'] = values
-            if warnings:
-                result["_warnings"] = warnings
-            return result
-        except requests.exceptions.RequestException as e:
-            print(f"请求错误: {e}")
-            result = {"_warnings": [f"请求错误: {e}"]}
+
+        # 边读取边解析：数值直接写入数组，不在请求范围内的国家/地区和年份随即丢弃，不构造完整的响应字典
+        response = self.client.get(path, params=params, stream=True)
+        with STAGE_SECONDS.time(stage='json_parse'):
+            try:
+                values, size = parse_values_stream(response, entities, years)
+            except ValueError as e:
+                raise requests.exceptions.InvalidJSONError(f"无法解析的响应: {e}")
+        PAYLOAD_BYTES.observe(size, kind='http_response')
+        return values
@@ -0,0 +1,171 @@
+from collections.abc import Mapping
+import numpy as np
+
+
+class ResultMatrix(Mapping):
+    """
+    查询结果的稠密矩阵表示：float64 数组，形状为 指标 × 国家/地区 × 年份，
+    并带有缺失值掩码和标签索引
+    同时实现只读的字典接口，与 query_data 返回的嵌套字典结构兼容
+    """
+    def __init__(self, indicators, entities, years):
+        """
+        :param indicators: 指标ID列表
+        :param entities: 国家/地区代码列表
+        :param years: 年份列表（升序）
+        """
+        self.indicators = list(indicators)
+        self.entities = list(entities)
+        self.years = np.asarray(years, dtype=np.int64)
+        self.indicator_index = {code: i for i, code in enumerate(self.indicators)}
+        self.entity_index = {code: i for i, code in enumerate(self.entities)}
+        self.year_index = {int(year): i for i, year in enumerate(self.years)}
+        shape = (len(self.indicators), len(self.entities), len(self.years))
+        self.values = np.full(shape, np.nan, dtype=np.float64)
+        self.mask = np.zeros(shape, dtype=bool)
+        self.warnings = []
+        # 上游请求失败（结果可能不完整或来自过期缓存）时为错误信息
+        self.error = None
+
+    @classmethod
+    def from_cells(cls, indicators, cells, entities=None, years=None):
+        """
+        由单元格字典构造矩阵
+        :param indicators: 指标ID列表
+        :param cells: {indicator: {(entity, year): value}}，value 为 None 表示没有数据
+        :param entities: 国家/地区代码列表，为空时取单元格中出现的全部国家/地区
+        :param years: 年份列表，为空时取单元格中出现的全部年份
+        :return: ResultMatrix
+        """
+        if not entities:
+            entities = sorted({entity for indicator in indicators for entity, _ in cells[indicator]})
+        if not years:
+            years = sorted({year for indicator in indicators for _, year in cells[indicator]})
+        matrix = cls(indicators, entities, sorted(years))
+        for i, indicator in enumerate(indicators):
+            for (entity, year), value in cells[indicator].items():
+                if value is None:
+                    continue
+                e = matrix.entity_index.get(entity)
+                y = matrix.year_index.get(year)
+                if e is not None and y is not None:
+                    matrix.values[i, e, y] = value
+                    matrix.mask[i, e, y] = True
+        return matrix
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        由 query_data 风格的嵌套字典构造矩阵
+        :param data: {indicator: {entity: {'years': [...], 'values': [...]}}}，可包含 _warnings
+        :return: ResultMatrix
+        """
+        indicators = [key for key in data if not key.startswith('_')]
+        cells = dict()
+        for indicator in indicators:
+            indicator_cells = cells[indicator] = dict()
+            for entity, entity_data in data[indicator].items():
+                for year, value in zip(entity_data.get('years', []), entity_data.get('values', [])):
+                    indicator_cells[(entity, int(year))] = value
+        entities = list(dict.fromkeys(entity for indicator in indicators for entity in data[indicator]))
+        matrix = cls.from_cells(indicators, cells, entities=entities)
+        matrix.warnings = list(data.get('_warnings', []))
+        return matrix
+
+    def select(self, indicators=None, entities=None, years=None):
+        """
+        按标签选取子矩阵（复制），不在矩阵中的标签对应的位置为没有数据
+        :param indicators: 指标ID列表，为 None 时保留全部
+        :param entities: 国家/地区代码列表，为 None 时保留全部
+        :param years: 年份列表（升序），为 None 时保留全部
+        :return: ResultMatrix，不包含警告
+        """
+        indicators = self.indicators if indicators is None else list(indicators)
+        entities = self.entities if entities is None else list(entities)
+        years = self.years.tolist() if years is None else list(years)
+        result = ResultMatrix(indicators, entities, years)
+        rows = [(i, self.indicator_index[code]) for i, code in enumerate(indicators) if code in self.indicator_index]
+        cols = [(e, self.entity_index[code]) for e, code in enumerate(entities) if code in self.entity_index]
+        year_cols = [(y, self.year_index[int(year)]) for y, year in enumerate(years) if int(year) in self.year_index]
+        if rows and cols and year_cols:
+            dst = np.ix_([i for i, _ in rows], [e for e, _ in cols], [y for y, _ in year_cols])
+            src = np.ix_([i for _, i in rows], [e for _, e in cols], [y for _, y in year_cols])
+            result.values[dst] = self.values[src]
+            result.mask[dst] = self.mask[src]
+        result.error = self.error
+        return result
+
+    def merge(self, other):
+        """
+        合并两个矩阵，标签取并集，同一单元格以 other 中的有效值为准
+        :return: 新的 ResultMatrix，不包含警告
+        """
+        indicators = self.indicators + [code for code in other.indicators if code not in self.indicator_index]
+        entities = self.entities + [code for code in other.entities if code not in self.entity_index]
+        years = sorted(set(self.years.tolist()) | set(other.years.tolist()))
+        result = self.select(indicators, entities, years)
+        update = other.select(indicators, entities, years)
+        result.values[update.mask] = update.values[update.mask]
+        result.mask |= update.mask
+        result.error = other.error
+        return result
+
+    def has_data(self, indicator):
+        """指标是否至少有一个有效值"""
+        i = self.indicator_index.get(indicator)
+        return i is not None and bool(self.mask[i].any())
+
+    def indicator_slice(self, indicator):
+        """
+        获取单个指标的数据（视图，不复制）
+        :return: (values, mask)，形状均为 国家/地区 × 年份
+        """
+        i = self.indicator_index[indicator]
+        return self.values[i], self.mask[i]
+
+    def series(self, indicator, entity):
+        """
+        获取单个国家/地区在某个指标上的有效数据
+        :return: (years, values) 两个 numpy 数组，只包含有值的年份
+        """
+        i = self.indicator_index[indicator]
+        e = self.entity_index[entity]
+        row_mask = self.mask[i, e]
+        return self.years[row_mask], self.values[i, e][row_mask]
+
+    def _indicator_dict(self, indicator):
+        indicator_result = dict()
+        for entity in self.entities:
+            years, values = self.series(indicator, entity)
+            indicator_result[entity] = {'years': years.tolist(), 'values': values.tolist()} if len(years) else {}
+        return indicator_result
+
+    def to_dict(self):
+        """
+        转换为 query_data 风格的嵌套字典
+        :return: {indicator: {entity: {'years': [...], 'values': [...]}}}，有警告时包含 _warnings
+        """
+        return {key: self[key] for key in self}
+
+    # 只读字典接口：键为有数据的指标，以及存在警告时的 _warnings
+    def __getitem__(self, key):
+        if key == '_warnings' and self.warnings:
+            return self.warnings
+        if key in self.indicator_index and self.has_data(key):
+            return self._indicator_dict(key)
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        if key == '_warnings':
+            return bool(self.warnings)
+        return self.has_data(key)
+
+    def __iter__(self):
+        for indicator in self.indicators:
+            if self.has_data(indicator):
+                yield indicator
+        if self.warnings:
+            yield '_warnings'
+
+    def __len__(self):
+        return sum(1 for _ in self)
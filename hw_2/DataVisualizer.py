@@ -1,20 +1,131 @@
-import matplotlib.pyplot as plt
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import numpy as np
+import time
 from io import BytesIO
+from DataMatrix import ResultMatrix
+from ChartCache import ChartCache
+from SvgRenderer import TAB10, render_svg, render_bar_svg, series_color
+from Metrics import STAGE_SECONDS
+
+_fonts_configured = False
+
+
+def configure_fonts():
+    """
+    设置中文字体（每个进程只需执行一次，渲染进程池的 initializer 也使用此函数）
+    """
+    global _fonts_configured
+    if _fonts_configured:
+        return
+    matplotlib.rcParams["font.sans-serif"]=["SimHei"] #设置字体
+    matplotlib.rcParams["axes.unicode_minus"]=False
+    _fonts_configured = True
+
+
+def render_chart(job, timings=None):
+    """
+    根据绘图任务生成图表，只使用面向对象的 Figure API 和 Agg 画布，不依赖 pyplot 全局状态，
+    可在线程或子进程中运行
+    :param job: DataVisualizer.plot_job 或 bar_job 生成的绘图任务（字典）
+    :param timings: 传入字典时记录各阶段耗时（秒），键为 draw、png_encode 或 svg_encode
+    :return: 二进制图像数据（PNG或SVG，取决于任务的 format）
+    """
+    start = time.perf_counter()
+    if job['format'] == 'svg':
+        img = render_bar_svg(job) if job.get('kind') == 'bar' else render_svg(job)
+        if timings is not None:
+            timings['svg_encode'] = time.perf_counter() - start
+        return img
+    configure_fonts()
+    fig = Figure(figsize=job['figsize'])
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    if job.get('kind') == 'bar':
+        _draw_bars(ax, job)
+    else:
+        _draw_lines(ax, job)
+    fig.tight_layout()
+    drawn = time.perf_counter()
+    # 转换为二进制图像
+    buf = BytesIO()
+    fig.savefig(buf, format='png', dpi=120)
+    if timings is not None:
+        timings['draw'] = drawn - start
+        timings['png_encode'] = time.perf_counter() - drawn
+    return buf.getvalue()
+
+
+def _draw_lines(ax, job):
+    """
+    折线图：每个国家/地区一条折线
+    """
+    # 绘制每个实体的数据
+    for idx, entity, years, values in job['series']:
+        # 绘制折线
+        ax.plot(years, values, marker='o', markersize=8, linewidth=2.5,color=series_color(idx), label=entity, alpha=0.9)
+        # 添加数据标签
+        DataVisualizer._smart_labels(ax, years, values)
+
+    ax.set_title(f"指标: {job['indicator']} ({job['indicator_label']})\n单位: {job['indicator_unit']}", fontsize=14, pad=20, fontweight='bold')
+    ax.set_xlabel("年份", fontsize=12, labelpad=10)
+    ax.set_ylabel("指标值", fontsize=12, labelpad=10)
+    ax.grid(True, linestyle='--', alpha=0.4)
+    ax.legend(loc='upper left', bbox_to_anchor=(1, 1), frameon=True, framealpha=0.8, title='国家/地区')
+    DataVisualizer._smart_xticks(ax, range(job['min_year'], job['max_year'] + 1))
+
+
+def _draw_bars(ax, job):
+    """
+    排名条形图：名次靠前的在上方，突出显示的国家/地区使用不同颜色
+    """
+    bars = job['bars']
+    positions = np.arange(len(bars))
+    colors = [TAB10[1] if highlighted else TAB10[0] for _, _, _, _, highlighted in bars]
+    values = [value for _, _, _, value, _ in bars]
+    ax.barh(positions, values, color=colors, alpha=0.9)
+    ax.set_yticks(positions)
+    ax.set_yticklabels([f"{rank}. {label}" for rank, _, label, _, _ in bars], fontsize=9)
+    ax.invert_yaxis()
+    for position, value in zip(positions, values):
+        ax.text(value, position, f' {value:.2f} ', fontsize=8, va='center', ha='left' if value >= 0 else 'right')
+    ax.axvline(0, color='#333', linewidth=0.8)
+    ax.set_title(f"指标: {job['indicator']} ({job['indicator_label']})\n{job['title']}  单位: {job['indicator_unit']}",
+                 fontsize=14, pad=20, fontweight='bold')
+    ax.set_xlabel("指标值", fontsize=12, labelpad=10)
+    ax.grid(True, axis='x', linestyle='--', alpha=0.4)
+
+
+def render_chart_timed(job):
+    """
+    供渲染进程池调用：渲染图表并返回各阶段耗时，由主进程记录到指标中
+    :return: (二进制图像数据, {阶段: 耗时})
+    """
+    timings = dict()
+    img = render_chart(job, timings)
+    return img, timings
+
+
 class DataVisualizer:
     """
     可视化IMF数据的类
     """
-    def __init__(self, data):
+    def __init__(self, data, chart_cache=None, derived_engine=None):
         """
         初始化可视化类
-        :param data: 转换后的数据（years/values为列表形式）
+        :param data: ResultMatrix，或转换后的嵌套字典（years/values为列表形式）
+        :param chart_cache: 已渲染图表的缓存（ChartCache），为 None 时不缓存
+        :param derived_engine: 派生指标引擎（DerivedEngine），数据中没有的派生指标由已有的原始指标计算
         """
+        if not isinstance(data, ResultMatrix):
+            data = ResultMatrix.from_dict(data)
         self.data = data
-        plt.rcParams["font.sans-serif"]=["SimHei"] #设置字体
-        plt.rcParams["axes.unicode_minus"]=False
+        self.chart_cache = chart_cache
+        self.derived_engine = derived_engine
 
-    def _smart_xticks(self, ax, years):
+    @staticmethod
+    def _smart_xticks(ax, years):
         """
         智能调整x轴刻度
         当年份数>8时自动旋转45度，超过15个年份时改为纵向显示
@@ -24,13 +135,14 @@ class DataVisualizer:
             ha = 'right' if rotation == 45 else 'center'
             ax.set_xticks(years)
             ax.set_xticklabels(years, rotation=rotation, ha=ha)
-            
+
             # 调整底部边距防止标签被裁剪
-            plt.subplots_adjust(bottom=0.25 if rotation == 45 else 0.4)
+            ax.figure.subplots_adjust(bottom=0.25 if rotation == 45 else 0.4)
         else:
             ax.set_xticks(years)
-            
-    def _smart_labels(self, ax, years, values):
+
+    @staticmethod
+    def _smart_labels(ax, years, values):
         """
         智能调整数据标签
         :param ax: Axes对象
@@ -54,63 +166,145 @@ class DataVisualizer:
                         boxstyle='round,pad=0.2'
                     )
                 )
-    
-    def plot_data(self, indicator, indicator_label, indicator_unit, entities,  figsize=(10, 7)):
+
+    def plot_job(self, indicator, indicator_label, indicator_unit, entities, figsize=(10, 7), fmt='png', max_points=None):
         """
-        数据可视化函数
+        生成绘图任务，任务只包含绘图所需的数据，可以发送到渲染子进程
         :param indicator: 指标ID (如: 'NGDP_RPCH')
         :param indicator_label: 指标名称
         :param indicator_unit: 指标单位描述
         :param entities: 国家/地区代码列表 (如: ['USA', 'CHN'])
         :param figsize: 图表尺寸 (宽, 高)
-        :return: 二进制图像数据
+        :param fmt: 输出格式，'png' 或 'svg'
+        :param max_points: SVG模式下每条折线最多绘制的点数（LTTB降采样），为 None 时不降采样
+        :return: (缓存键, 绘图任务)
         """
-        if indicator not in self.data:
+        if fmt not in ('png', 'svg'):
+            raise ValueError(f"不支持的图表格式: {fmt}")
+        if indicator not in self.data.indicator_index and self.derived_engine is not None \
+                and self.derived_engine.is_derived(indicator):
+            # 用数据中已有的原始指标计算派生指标，不发起请求
+            self.data = self.derived_engine.evaluate(self.data, self.data.indicators + [indicator], self.data.years.tolist())
+        if indicator not in self.data.indicator_index:
             raise ValueError(f"指标 {indicator} 不存在于数据中")
-        indicator_data = self.data[indicator]
-        # 获取所有年份范围（用于统一x轴）
-        all_years = set()
-        for entity in entities:
-            if entity not in indicator_data:
-                continue
-            all_years.update(indicator_data[entity]['years'])
-        min_year, max_year = min(all_years), max(all_years)
-        
-        fig, ax = plt.subplots(figsize=figsize)
-        colors = plt.cm.tab10(np.linspace(0, 1, len(entities)))
-        
-        # 绘制每个实体的数据
+        values, mask = self.data.indicator_slice(indicator)
+        years = self.data.years
+        rows = []
+        series = []
         for idx, entity in enumerate(entities):
-            try:
-                data = indicator_data[entity]
-            except KeyError:
+            row = self.data.entity_index.get(entity)
+            rows.append(row)
+            if row is None or not mask[row].any():
                 print(f"警告: 实体 {entity} 在指标 {indicator} 中没有数据")
                 continue
+            row_mask = mask[row]
+            series.append((idx, entity, years[row_mask], values[row][row_mask]))
+        # 获取所有年份范围（用于统一x轴）
+        if not series:
+            raise ValueError(f"指标 {indicator} 在所选国家/地区中没有数据")
+        min_year = min(int(entity_years[0]) for _, _, entity_years, _ in series)
+        max_year = max(int(entity_years[-1]) for _, _, entity_years, _ in series)
+        job = {
+            'indicator': indicator,
+            'indicator_label': indicator_label,
+            'indicator_unit': indicator_unit,
+            'entities': list(entities),
+            'series': series,
+            'min_year': min_year,
+            'max_year': max_year,
+            'figsize': tuple(figsize),
+            'format': fmt,
+            'max_points': max_points,
+        }
+        cache_key = self._chart_key(indicator, indicator_label, indicator_unit, entities, rows, figsize, fmt, max_points)
+        return cache_key, job
 
-            try:
-                years = data['years']
-                values = data['values']
-            except KeyError as e:
-                print(f"警告: 实体 {entity} 的数据缺少关键字段: {e}")
-                continue
-            
-            # 绘制折线
-            ax.plot(years,values, marker='o', markersize=8, linewidth=2.5,color=colors[idx], label=entity, alpha=0.9)
-            # 添加数据标签
-            self._smart_labels(ax, years, values)
-            
-        
-        ax.set_title(f"指标: {indicator} ({indicator_label})\n单位: {indicator_unit}", fontsize=14, pad=20, fontweight='bold')
-        ax.set_xlabel("年份", fontsize=12, labelpad=10)
-        ax.set_ylabel("指标值", fontsize=12, labelpad=10)
-        ax.grid(True, linestyle='--', alpha=0.4)
-        ax.legend(loc='upper left', bbox_to_anchor=(1, 1), frameon=True, framealpha=0.8, title='国家/地区')
-        self._smart_xticks(ax, range(min_year, max_year + 1))
-        plt.tight_layout()
-        # 转换为二进制图像
-        buf = BytesIO()
-        plt.savefig(buf, format='png', dpi=120)
-        plt.close(fig)
-        return buf.getvalue()
-        
+    def plot_data(self, indicator, indicator_label, indicator_unit, entities,  figsize=(10, 7), fmt='png', max_points=None):
+        """
+        数据可视化函数
+        :param indicator: 指标ID (如: 'NGDP_RPCH')
+        :param indicator_label: 指标名称
+        :param indicator_unit: 指标单位描述
+        :param entities: 国家/地区代码列表 (如: ['USA', 'CHN'])
+        :param figsize: 图表尺寸 (宽, 高)
+        :param fmt: 输出格式，'png' 或 'svg'
+        :param max_points: SVG模式下每条折线最多绘制的点数，为 None 时不降采样
+        :return: 二进制图像数据
+        """
+        cache_key, job = self.plot_job(indicator, indicator_label, indicator_unit, entities, figsize, fmt, max_points)
+        # 相同数据和参数的图表直接从缓存返回
+        if self.chart_cache is not None:
+            img = self.chart_cache.get(cache_key)
+            if img is not None:
+                return img
+        timings = dict()
+        img = render_chart(job, timings)
+        for stage, seconds in timings.items():
+            STAGE_SECONDS.observe(seconds, stage=stage)
+        if self.chart_cache is not None:
+            self.chart_cache.put(cache_key, img)
+        return img
+
+    @staticmethod
+    def bar_job(indicator, indicator_label, indicator_unit, title, bars, highlight=(), figsize=(10, 7), fmt='png'):
+        """
+        生成排名条形图的绘图任务
+        :param indicator: 指标ID
+        :param indicator_label: 指标名称
+        :param indicator_unit: 指标单位描述
+        :param title: 副标题 (如: '2023年 前20名')
+        :param bars: 列表，元素为 (名次, 国家/地区代码, 显示名称, 值)，按从上到下的顺序
+        :param highlight: 需要突出显示的国家/地区代码
+        :param figsize: 图表尺寸 (宽, 高)
+        :param fmt: 输出格式，'png' 或 'svg'
+        :return: (缓存键, 绘图任务)
+        """
+        if fmt not in ('png', 'svg'):
+            raise ValueError(f"不支持的图表格式: {fmt}")
+        if not bars:
+            raise ValueError(f"指标 {indicator} 没有可排名的数据")
+        highlight = set(highlight)
+        bars = [(int(rank), entity, label, float(value), entity in highlight) for rank, entity, label, value in bars]
+        job = {
+            'kind': 'bar',
+            'indicator': indicator,
+            'indicator_label': indicator_label,
+            'indicator_unit': indicator_unit,
+            'title': title,
+            'bars': bars,
+            'figsize': tuple(figsize),
+            'format': fmt,
+        }
+        cache_key = ChartCache.make_key('bar', 'png-120dpi' if fmt == 'png' else 'svg', indicator, indicator_label,
+                                        indicator_unit, title, tuple(bars), tuple(figsize))
+        return cache_key, job
 
+    def plot_bar(self, indicator, indicator_label, indicator_unit, title, bars, highlight=(), figsize=(10, 7), fmt='png'):
+        """
+        排名条形图，参数同 bar_job
+        :return: 二进制图像数据
+        """
+        cache_key, job = self.bar_job(indicator, indicator_label, indicator_unit, title, bars, highlight, figsize, fmt)
+        if self.chart_cache is not None:
+            img = self.chart_cache.get(cache_key)
+            if img is not None:
+                return img
+        img = render_chart(job)
+        if self.chart_cache is not None:
+            self.chart_cache.put(cache_key, img)
+        return img
+
+    def _chart_key(self, indicator, indicator_label, indicator_unit, entities, rows, figsize, fmt, max_points):
+        """
+        计算图表缓存键：所选国家/地区的数据、年份以及所有绘图参数的哈希
+        """
+        values, mask = self.data.indicator_slice(indicator)
+        present_rows = [row for row in rows if row is not None]
+        return ChartCache.make_key(
+            'png-120dpi' if fmt == 'png' else 'svg', max_points, TAB10,
+            indicator, indicator_label, indicator_unit, tuple(entities), tuple(figsize),
+            tuple(row is not None for row in rows),
+            self.data.years.tobytes(),
+            np.ascontiguousarray(values[present_rows]).tobytes(),
+            np.ascontiguousarray(mask[present_rows]).tobytes(),
+        )
@@ -0,0 +1,309 @@
+import ast
+import operator
+import numpy as np
+from DataMatrix import ResultMatrix
+
+# 预定义的派生指标：代码 -> 目录条目（与 available_indicators.json 的格式一致，另加 expression）
+# 表达式中的名称为IMF指标代码，NGDPD 单位为十亿美元，LP 单位为百万人
+DERIVED_INDICATORS = {
+    'D_NGDPD_PC': {
+        'label': 'GDP per capita, current prices (derived)',
+        'unit': 'U.S. dollars per person',
+        'expression': 'NGDPD * 1000 / LP',
+    },
+    'D_NGDPD_YOY': {
+        'label': 'GDP, current prices, year-over-year change (derived)',
+        'unit': 'Annual percent change',
+        'expression': 'yoy(NGDPD)',
+    },
+    'D_NGDPD_PC_YOY': {
+        'label': 'GDP per capita, year-over-year change (derived)',
+        'unit': 'Annual percent change',
+        'expression': 'yoy(NGDPD / LP)',
+    },
+    'D_LP_YOY': {
+        'label': 'Population growth (derived)',
+        'unit': 'Annual percent change',
+        'expression': 'yoy(LP)',
+    },
+    'D_NGDP_RPCH_MA5': {
+        'label': 'Real GDP growth, 5-year rolling mean (derived)',
+        'unit': 'Percent',
+        'expression': 'rolling_mean(NGDP_RPCH, 5)',
+    },
+    'D_NGDPD_IDX2000': {
+        'label': 'GDP, current prices, index 2000 = 100 (derived)',
+        'unit': 'Index, 2000 = 100',
+        'expression': 'index_to(NGDPD, 2000)',
+    },
+    'D_NGDPD_SHARE': {
+        'label': 'Share of GDP among selected countries (derived)',
+        'unit': 'Percent of selection total',
+        'expression': 'share(NGDPD)',
+    },
+    'D_NGDPD_PC_RANK': {
+        'label': 'GDP per capita, rank among selected countries (derived)',
+        'unit': 'Rank (1 = highest)',
+        'expression': 'rank(NGDPD / LP)',
+    },
+}
+
+DERIVED_DATASET = '派生指标'
+
+_BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Pow: operator.pow,
+}
+_UNARY_OPS = {
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+
+
+def _shift(x, n):
+    """沿年份方向后移 n 列，空出的位置为 NaN"""
+    shifted = np.full_like(x, np.nan)
+    if n < x.shape[1]:
+        shifted[:, n:] = x[:, :x.shape[1] - n]
+    return shifted
+
+
+def pct_change(x, n=1):
+    """相对 n 年前的变化率（%）"""
+    return (x / _shift(x, n) - 1) * 100
+
+
+def yoy(x):
+    """同比变化率（%）"""
+    return pct_change(x, 1)
+
+
+def diff(x, n=1):
+    """相对 n 年前的差值"""
+    return x - _shift(x, n)
+
+
+def rolling_mean(x, window):
+    """
+    n 年滚动平均，窗口内有缺失值时结果为 NaN
+    """
+    valid = ~np.isnan(x)
+    sums = np.cumsum(np.where(valid, x, 0.0), axis=1)
+    counts = np.cumsum(valid, axis=1)
+    sums = np.concatenate([np.zeros((x.shape[0], 1)), sums], axis=1)
+    counts = np.concatenate([np.zeros((x.shape[0], 1), dtype=counts.dtype), counts], axis=1)
+    result = np.full_like(x, np.nan)
+    if window <= x.shape[1]:
+        window_sums = sums[:, window:] - sums[:, :-window]
+        window_counts = counts[:, window:] - counts[:, :-window]
+        result[:, window - 1:] = np.where(window_counts == window, window_sums / window, np.nan)
+    return result
+
+
+def rank(x):
+    """
+    每年在所选国家/地区中的排名，1 为最大值，缺失值不参与排名
+    """
+    # NaN 排在最后：以 -inf 代替后按降序排序
+    order = np.argsort(-np.where(np.isnan(x), -np.inf, x), axis=0, kind='stable')
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(1, x.shape[0] + 1)[:, None].repeat(x.shape[1], axis=1), axis=0)
+    return np.where(np.isnan(x), np.nan, ranks.astype(np.float64))
+
+
+def share(x):
+    """每年占所选国家/地区合计的比例（%）"""
+    totals = np.nansum(x, axis=0)
+    return x / np.where(totals == 0, np.nan, totals) * 100
+
+
+# 可在表达式中使用的函数：名称 -> (函数, 常量参数个数范围, 需要的历史年数)
+FUNCTIONS = {
+    'yoy': (yoy, (0, 0), lambda: 1),
+    'pct_change': (pct_change, (0, 1), lambda n=1: n),
+    'diff': (diff, (0, 1), lambda n=1: n),
+    'rolling_mean': (rolling_mean, (1, 1), lambda window: window - 1),
+    'index_to': (None, (1, 1), lambda base_year: 0),
+    'rank': (rank, (0, 0), lambda: 0),
+    'share': (share, (0, 0), lambda: 0),
+    'log': (np.log, (0, 0), lambda: 0),
+    'abs': (np.abs, (0, 0), lambda: 0),
+}
+
+
+class Expression:
+    """
+    解析后的派生指标表达式
+    只允许四则运算、乘方、数字常量、指标代码和 FUNCTIONS 中的函数，不执行任何Python代码
+    """
+    def __init__(self, source):
+        """
+        :param source: 表达式文本 (如: 'NGDPD * 1000 / LP')
+        """
+        self.source = source
+        try:
+            tree = ast.parse(source, mode='eval')
+        except SyntaxError as e:
+            raise ValueError(f"表达式语法错误: {source}") from e
+        self.dependencies = []
+        self.base_years = set()
+        self.lookback = self._check(tree.body)
+        self._tree = tree.body
+
+    def _check(self, node):
+        """
+        检查节点是否合法，同时收集依赖的指标和需要的历史年数
+        :return: 需要的历史年数
+        """
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+            return max(self._check(node.left), self._check(node.right))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+            return self._check(node.operand)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            return 0
+        if isinstance(node, ast.Name):
+            if node.id not in self.dependencies:
+                self.dependencies.append(node.id)
+            return 0
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS and not node.keywords:
+            _, (min_args, max_args), lookback = FUNCTIONS[node.func.id]
+            if not node.args or not min_args <= len(node.args) - 1 <= max_args:
+                raise ValueError(f"函数 {node.func.id} 的参数个数错误: {self.source}")
+            constants = [self._constant(arg) for arg in node.args[1:]]
+            if node.func.id == 'index_to':
+                self.base_years.add(constants[0])
+            return self._check(node.args[0]) + lookback(*constants)
+        raise ValueError(f"表达式中包含不支持的内容: {ast.get_source_segment(self.source, node) or self.source}")
+
+    def _constant(self, node):
+        if isinstance(node, ast.Constant) and isinstance(node.value, int) and not isinstance(node.value, bool) and node.value >= 0:
+            return node.value
+        raise ValueError(f"函数参数必须是非负整数: {self.source}")
+
+    def evaluate(self, matrix):
+        """
+        在矩阵上计算表达式
+        :param matrix: ResultMatrix，包含全部依赖的指标，年份连续
+        :return: 国家/地区 × 年份 的数组，没有数据的位置为 NaN
+        """
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            result = self._eval(self._tree, matrix)
+        result = np.broadcast_to(np.asarray(result, dtype=np.float64), matrix.values.shape[1:]).copy()
+        result[~np.isfinite(result)] = np.nan
+        return result
+
+    def _eval(self, node, matrix):
+        if isinstance(node, ast.BinOp):
+            return _BINARY_OPS[type(node.op)](self._eval(node.left, matrix), self._eval(node.right, matrix))
+        if isinstance(node, ast.UnaryOp):
+            return _UNARY_OPS[type(node.op)](self._eval(node.operand, matrix))
+        if isinstance(node, ast.Constant):
+            return float(node.value)
+        if isinstance(node, ast.Name):
+            if node.id not in matrix.indicator_index:
+                return np.full(matrix.values.shape[1:], np.nan)
+            return matrix.values[matrix.indicator_index[node.id]]
+        x = np.broadcast_to(np.asarray(self._eval(node.args[0], matrix), dtype=np.float64), matrix.values.shape[1:])
+        constants = [arg.value for arg in node.args[1:]]
+        if node.func.id == 'index_to':
+            base = matrix.year_index.get(constants[0])
+            if base is None:
+                return np.full_like(x, np.nan)
+            return x / x[:, base:base + 1] * 100
+        return FUNCTIONS[node.func.id][0](x, *constants)
+
+
+class DerivedEngine:
+    """
+    派生指标引擎：在 DataManager 的查询结果上向量化计算派生指标
+    查询时先换算为所需的原始指标和年份（包括计算变化率、滚动平均所需的历史年份），
+    原始数据经由观测值缓存获取，计算完成后只保留请求的年份
+    """
+    def __init__(self, definitions=None):
+        """
+        :param definitions: 派生指标定义 {code: {'label', 'unit', 'expression'}}，默认为 DERIVED_INDICATORS
+        """
+        self.definitions = dict(DERIVED_INDICATORS if definitions is None else definitions)
+        self.expressions = {code: Expression(info['expression']) for code, info in self.definitions.items()}
+
+    def define(self, code, expression, label=None, unit=''):
+        """
+        添加派生指标
+        :raise ValueError: 表达式不合法
+        """
+        self.expressions[code] = Expression(expression)
+        self.definitions[code] = {'label': label or expression, 'unit': unit, 'expression': expression}
+
+    def is_derived(self, code):
+        return code in self.expressions
+
+    def catalog(self, available_indicators):
+        """
+        生成派生指标的目录条目，只包含依赖的指标都存在的派生指标
+        :param available_indicators: 原始指标目录
+        :return: {code: 目录条目}
+        """
+        catalog = dict()
+        for code, info in self.definitions.items():
+            if all(dependency in available_indicators for dependency in self.expressions[code].dependencies):
+                catalog[code] = dict(info, source='Derived from IMF data', dataset=DERIVED_DATASET)
+        return catalog
+
+    def plan(self, indicators, years):
+        """
+        换算查询计划
+        :param indicators: 请求的指标（可包含派生指标）
+        :param years: 请求的年份，为空时表示全部年份
+        :return: (需要查询的原始指标列表, 需要查询的年份列表)
+        """
+        raw = []
+        lookback = 0
+        base_years = set()
+        for code in indicators:
+            expression = self.expressions.get(code)
+            codes = expression.dependencies if expression else [code]
+            raw += [dependency for dependency in codes if dependency not in raw]
+            if expression:
+                lookback = max(lookback, expression.lookback)
+                base_years |= expression.base_years
+        if not years:
+            return raw, years
+        start = min([min(years) - lookback] + list(base_years))
+        end = max([max(years)] + list(base_years))
+        return raw, list(range(start, end + 1))
+
+    def evaluate(self, matrix, indicators, years):
+        """
+        计算派生指标并截取请求的年份
+        :param matrix: 按 plan 查询得到的 ResultMatrix
+        :param indicators: 请求的指标（可包含派生指标）
+        :param years: 请求的年份，为空时保留全部年份
+        :return: ResultMatrix，指标顺序与请求一致
+        """
+        years = sorted(years) if years else matrix.years.tolist()
+        columns = [matrix.year_index[year] for year in years if year in matrix.year_index]
+        result = ResultMatrix(indicators, matrix.entities, [int(matrix.years[column]) for column in columns])
+        for i, code in enumerate(indicators):
+            expression = self.expressions.get(code)
+            if expression is not None:
+                values = expression.evaluate(matrix)[:, columns]
+            elif code in matrix.indicator_index:
+                values = matrix.values[matrix.indicator_index[code]][:, columns]
+            else:
+                continue
+            result.mask[i] = ~np.isnan(values)
+            result.values[i] = values
+        # 只保留与请求的指标相关的警告
+        dependencies_only = set(matrix.indicators) - set(indicators)
+        result.error = matrix.error
+        result.warnings = [warning for warning in matrix.warnings
+                           if not any(f"在指标 {code} 中没有数据" in warning for code in dependencies_only)]
+        if matrix.entities and len(result.years):
+            for i, code in enumerate(indicators):
+                if code in self.expressions:
+                    for e in np.flatnonzero(~result.mask[i].any(axis=1)):
+                        result.warnings.append(f"警告: {result.entities[e]} 在指标 {code} 中没有数据")
+        return result
@@ -0,0 +1,220 @@
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from Metrics import STAGE_SECONDS, HTTP_RESPONSES, HTTP_ERRORS, HTTP_RETRIES, PAYLOAD_BYTES
+
+# API根地址，可通过环境变量 IMF_API_BASE_URL 修改（如指向 MockImfServer）
+IMF_BASE_URL = os.environ.get('IMF_API_BASE_URL') or 'https://www.imf.org/external/datamapper/api/v1'
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """熔断器处于打开状态时抛出，调用方可按普通请求错误处理"""
+
+
+class TokenBucket:
+    """
+    客户端令牌桶限流器
+    """
+    def __init__(self, rate, capacity):
+        """
+        :param rate: 每秒补充的令牌数
+        :param capacity: 令牌桶容量（允许的突发请求数）
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        获取一个令牌，令牌不足时阻塞等待
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败达到阈值后打开，冷却时间过后放行一个探测请求（半开状态）
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        """
+        :param failure_threshold: 打开熔断器所需的连续失败次数
+        :param reset_timeout: 打开后经过多少秒进入半开状态
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self._opened_at is not None and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def allow(self):
+        """
+        判断当前是否允许发出请求
+        :return: 布尔值
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._probing:
+                return False
+            # 半开状态，只放行一个探测请求
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class ImfClient:
+    """
+    IMF datamapper API 的共享HTTP客户端
+    连接复用、超时、对429/5xx的指数退避重试（带抖动）、令牌桶限流和熔断
+    """
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(self, base_url=IMF_BASE_URL, timeout=(3.05, 30), max_retries=3, backoff_base=0.5,
+                 backoff_max=8, rate=5, burst=10, pool_size=16, failure_threshold=5, reset_timeout=30):
+        """
+        :param base_url: API根地址
+        :param timeout: (连接超时, 读取超时)，单位秒
+        :param max_retries: 最大重试次数
+        :param backoff_base: 退避基数（秒），第n次重试最多等待 backoff_base * 2**n 秒
+        :param backoff_max: 单次退避的最长等待时间（秒）
+        :param rate: 每秒最多发出的请求数
+        :param burst: 允许的突发请求数
+        :param pool_size: 连接池大小
+        :param failure_threshold: 熔断器打开所需的连续失败次数
+        :param reset_timeout: 熔断器打开后的冷却时间（秒）
+        """
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _backoff(self, attempt, response=None):
+        """
+        计算第 attempt 次重试前的等待时间（full jitter），429响应优先使用 Retry-After
+        """
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def get(self, path, params=None, headers=None, stream=False):
+        """
+        发起GET请求
+        :param path: 相对于 base_url 的路径 (如: '/indicators')
+        :param params: 查询参数
+        :param headers: 额外的请求头
+        :param stream: 是否以流式方式读取响应体
+        :return: requests.Response（非2xx/3xx的响应会抛出 HTTPError）
+        """
+        if not self.breaker.allow():
+            HTTP_ERRORS.inc(kind='circuit_open')
+            raise CircuitOpenError(f"IMF API 暂时不可用（熔断中）: {path}")
+        # 任何结果都要记录到熔断器，否则半开状态的探测请求结束后熔断器将一直拒绝请求
+        try:
+            response = self._get_with_retries(self.base_url + path, params, headers, stream)
+        except requests.exceptions.HTTPError as e:
+            # 4xx（429除外）是请求本身的问题，不计入熔断
+            if e.response is not None and e.response.status_code not in self.RETRY_STATUS:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return response
+
+    def _get_with_retries(self, url, params, headers, stream):
+        """
+        发起GET请求，对连接错误、超时和429/5xx进行重试
+        :return: requests.Response
+        :raise requests.exceptions.RequestException: 重试用尽或不可重试的错误
+        """
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            response = None
+            try:
+                with STAGE_SECONDS.time(stage='http'):
+                    response = self.session.get(url, params=params, headers=headers, timeout=self.timeout, stream=stream)
+                HTTP_RESPONSES.inc(status=response.status_code)
+                if not stream:
+                    PAYLOAD_BYTES.observe(len(response.content), kind='http_response')
+                if response.status_code not in self.RETRY_STATUS:
+                    response.raise_for_status()
+                    return response
+                error = requests.exceptions.HTTPError(
+                    f"{response.status_code} Error for url: {response.url}", response=response)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                HTTP_ERRORS.inc(kind='timeout' if isinstance(e, requests.exceptions.Timeout) else 'connection')
+                error = e
+            except requests.exceptions.HTTPError:
+                raise
+            except requests.exceptions.RequestException:
+                # 响应体读取中断、重定向过多等，不重试
+                HTTP_ERRORS.inc(kind='other')
+                raise
+            if attempt >= self.max_retries:
+                raise error
+            delay = self._backoff(attempt, response)
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+            HTTP_RETRIES.inc()
+            attempt += 1
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client():
+    """
+    获取进程内共享的 ImfClient 实例
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = ImfClient()
+        return _default_client
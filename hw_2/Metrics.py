@@ -0,0 +1,263 @@
+import bisect
+import os
+import threading
+import time
+
+# 默认的耗时直方图分桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# 字节数直方图分桶
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+class _NullTimer:
+    """指标关闭时使用的空计时器"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = dict()
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def samples(self):
+        """
+        :return: [(指标名后缀, 标签字符串, 值)]
+        """
+        with self._lock:
+            items = sorted(self._values.items())
+        return [('', _format_labels(self.labelnames, key), value) for key, value in items]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        lines += [f'{self.name}{suffix}{labels} {_format_value(value)}' for suffix, labels, value in self.samples()]
+        return lines
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值"""
+    type = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    """分桶直方图，同时记录总和与次数"""
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        """
+        计时上下文管理器：with histogram.time(stage='draw'): ...
+        指标关闭时返回空计时器，不调用计时函数
+        """
+        if not self.registry.enabled:
+            return _NULL_TIMER
+        return _Timer(self, labels)
+
+    def summary(self, **labels):
+        """
+        :return: (次数, 总和, 估算的中位数)，中位数取所在分桶的上界
+        """
+        state = self._values.get(self._key(labels))
+        if state is None:
+            return 0, 0.0, None
+        with self._lock:
+            counts, total, count = list(state[0]), state[1], state[2]
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            if cumulative * 2 >= count:
+                return count, total, bound
+        return count, total, None
+
+    def label_values(self):
+        with self._lock:
+            return sorted(self._values)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self._values.items())
+        samples = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', _format_labels(self.labelnames, key, [('le', _format_value(float(bound)))]),
+                                cumulative))
+            labels = _format_labels(self.labelnames, key)
+            samples.append(('_sum', labels, total))
+            samples.append(('_count', labels, count))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+    关闭时所有记录操作只做一次属性判断后立即返回
+    """
+    def __init__(self, enabled=True):
+        """
+        :param enabled: 是否记录指标
+        """
+        self.enabled = enabled
+        self._metrics = dict()
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(self, name, documentation, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def metrics(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    def add_collector(self, collector):
+        """
+        注册采集函数，在导出时调用，用于导出其他组件已有的统计信息
+        :param collector: 无参函数，返回 [(指标名, 类型, 说明, [(标签字典, 值)])]
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self):
+        """
+        :return: Prometheus 文本格式的全部指标
+        """
+        lines = []
+        for metric in self.metrics():
+            lines += metric.render()
+        with self._lock:
+            collectors = list(self._collectors)
+        for collector in collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                print(f"指标采集失败: {e}")
+                continue
+            for name, metric_type, documentation, samples in families:
+                lines += [f'# HELP {name} {documentation}', f'# TYPE {name} {metric_type}']
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+# 进程内共享的注册表，设置环境变量 IMF_METRICS=0 关闭
+REGISTRY = MetricsRegistry(enabled=os.environ.get('IMF_METRICS', '1') != '0')
+
+# 各阶段耗时：http、json_parse、query、draw、png_encode、svg_encode、render、put_image
+# 数据请求以流式方式读取，http 只包括到收到响应头为止，响应体的传输计入 json_parse
+STAGE_SECONDS = REGISTRY.histogram('imf_stage_seconds', '各处理阶段的耗时（秒）', ['stage'])
+HTTP_RESPONSES = REGISTRY.counter('imf_http_responses_total', '上游API响应数（按状态码）', ['status'])
+HTTP_ERRORS = REGISTRY.counter('imf_http_errors_total', '上游API请求错误数（连接错误、超时、熔断、其他）', ['kind'])
+HTTP_RETRIES = REGISTRY.counter('imf_http_retries_total', '上游API请求重试次数')
+PAYLOAD_BYTES = REGISTRY.histogram('imf_payload_bytes', '响应体和图表大小（字节）', ['kind'], buckets=SIZE_BUCKETS)
+# 同一缓存的命中和未命中使用相同的 cache 标签；命中时 tier 为提供数据的层级（memory、disk），未命中时为空
+CACHE_REQUESTS = REGISTRY.counter('imf_cache_requests_total', '缓存命中/未命中次数', ['cache', 'result', 'tier'])
+ACTIVE_SESSIONS = REGISTRY.gauge('imf_active_sessions', '当前连接的会话数')
@@ -0,0 +1,168 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import zlib
+import numpy as np
+import tornado.ioloop
+import tornado.web
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+ALL_YEARS = list(range(1980, 2030))
+
+
+class MockDatamapper:
+    """
+    本地模拟的 IMF datamapper API 数据源
+    目录来自仓库中的 available_indicators.json / available_entities.json，
+    数值序列按 (指标, 国家/地区) 确定性生成，相同参数的请求总是返回相同数据
+    """
+    def __init__(self, catalog_dir=None, missing_rate=0.1):
+        """
+        :param catalog_dir: 目录文件所在目录，默认为本模块目录
+        :param missing_rate: (指标, 国家/地区) 组合没有数据的比例
+        """
+        catalog_dir = catalog_dir or MODULE_DIR
+        with open(os.path.join(catalog_dir, 'available_indicators.json'), 'r') as f:
+            self.indicators = json.load(f)
+        with open(os.path.join(catalog_dir, 'available_entities.json'), 'r') as f:
+            self.entities = json.load(f)
+        self.missing_rate = missing_rate
+        self._series = dict()
+
+    def series(self, indicator, entity):
+        """
+        :return: {year: value}，没有数据时为空字典
+        """
+        key = (indicator, entity)
+        series = self._series.get(key)
+        if series is None:
+            seed = zlib.crc32(f'{indicator}/{entity}'.encode('utf-8'))
+            rng = np.random.default_rng(seed)
+            if rng.random() < self.missing_rate:
+                series = dict()
+            else:
+                # 随机游走，起止年份随机，模拟部分国家/地区数据不完整
+                start = ALL_YEARS[int(rng.integers(0, 15))]
+                level = float(rng.uniform(1, 1000))
+                values = level + np.cumsum(rng.normal(0, level * 0.05, len(ALL_YEARS)))
+                series = {str(year): round(float(value), 3) for year, value in zip(ALL_YEARS, values) if year >= start}
+            self._series[key] = series
+        return series
+
+    def values(self, indicators, entities, years):
+        """
+        :param entities: 为空时返回全部国家/地区
+        :param years: 为空时返回全部年份
+        :return: {'values': {indicator: {entity: {year: value}}}}
+        """
+        entities = entities or list(self.entities)
+        wanted = set(str(year) for year in years) if years else None
+        result = dict()
+        for indicator in indicators:
+            indicator_values = dict()
+            for entity in entities:
+                series = self.series(indicator, entity)
+                if wanted is not None:
+                    series = {year: value for year, value in series.items() if year in wanted}
+                if series:
+                    indicator_values[entity] = series
+            result[indicator] = indicator_values
+        return {'values': result}
+
+
+class MockHandler(tornado.web.RequestHandler):
+    """
+    模拟 datamapper 的请求处理：/indicators、/countries 以及 /{指标...}/{国家/地区...}?periods=...
+    """
+    def initialize(self, source, latency, jitter, error_rate, error_status, stats):
+        self.source = source
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.stats = stats
+
+    async def get(self, path=None):
+        self.stats['requests'] += 1
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            self.stats['errors'] += 1
+            self.set_status(self.error_status)
+            if self.error_status == 429:
+                self.set_header('Retry-After', '0')
+            self.finish({'error': 'injected'})
+            return
+
+        parts = [part for part in (path or '').split('/') if part]
+        if parts == ['indicators']:
+            body = {'indicators': self.source.indicators}
+        elif parts == ['countries']:
+            body = {'countries': self.source.entities}
+        else:
+            indicators = [part for part in parts if part in self.source.indicators]
+            entities = [part for part in parts if part not in self.source.indicators]
+            periods = self.get_argument('periods', '')
+            years = [int(year) for year in periods.split(',') if year]
+            body = self.source.values(indicators, entities, years)
+        payload = json.dumps(body).encode('utf-8')
+        if parts in (['indicators'], ['countries']):
+            etag = '"' + hashlib.sha256(payload).hexdigest()[:32] + '"'
+            self.set_header('ETag', etag)
+            if self.request.headers.get('If-None-Match') == etag:
+                self.set_status(304)
+                self.finish()
+                return
+        self.set_header('Content-Type', 'application/json')
+        self.stats['bytes'] += len(payload)
+        self.finish(payload)
+
+
+class StatsHandler(tornado.web.RequestHandler):
+    """GET /_stats：返回模拟服务器的请求计数"""
+    def initialize(self, stats):
+        self.stats = stats
+
+    def get(self):
+        self.finish(self.stats)
+
+
+def make_app(latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, catalog_dir=None, missing_rate=0.1):
+    """
+    创建模拟服务器应用，API根地址为 http://host:port/external/datamapper/api/v1
+    :param latency: 每个请求的固定延迟（秒）
+    :param jitter: 额外的随机延迟上限（秒）
+    :param error_rate: 返回错误状态码的概率
+    :param error_status: 注入的错误状态码
+    """
+    source = MockDatamapper(catalog_dir, missing_rate)
+    stats = {'requests': 0, 'errors': 0, 'bytes': 0}
+    options = dict(source=source, latency=latency, jitter=jitter, error_rate=error_rate,
+                   error_status=error_status, stats=stats)
+    return tornado.web.Application([
+        (r"/_stats", StatsHandler, dict(stats=stats)),
+        (r"/external/datamapper/api/v1(/.*)?", MockHandler, options),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟的 IMF datamapper API 服务器')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的固定延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='额外的随机延迟上限（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回错误状态码的概率')
+    parser.add_argument('--error-status', type=int, default=503, help='注入的错误状态码')
+    parser.add_argument('--missing-rate', type=float, default=0.1, help='没有数据的 (指标, 国家/地区) 组合比例')
+    args = parser.parse_args()
+    app = make_app(args.latency, args.jitter, args.error_rate, args.error_status, missing_rate=args.missing_rate)
+    app.listen(args.port, address='127.0.0.1')
+    print(f"Mock IMF API on http://127.0.0.1:{args.port}/external/datamapper/api/v1", flush=True)
+    tornado.ioloop.IOLoop.current().start()
+
+
+if __name__ == '__main__':
+    main()
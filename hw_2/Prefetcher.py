@@ -0,0 +1,189 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from CatalogStore import atomic_write_json
+try:
+    import fcntl
+except ImportError:
+    # Windows 上没有 fcntl，只支持单进程运行
+    fcntl = None
+
+# 默认选项，首次部署时即使没有使用记录也会预取
+DEFAULT_QUERY = (('NGDP_RPCH', 'LP'), ('USA', 'CHN'), 1980, 2029)
+
+
+class UsageProfile:
+    """
+    记录每个查询组合 (指标, 国家/地区集合, 年份范围) 的使用次数，并定期保存到文件
+    多个工作进程共享同一文件：保存时在文件锁内读取其他进程已写入的计数，加上本进程新增的计数后写回
+    record 在事件循环中调用，只记录计数；到期的保存（文件锁和文件读写）在后台线程中执行
+    """
+    def __init__(self, path, save_interval=60):
+        """
+        :param path: 使用记录文件路径
+        :param save_interval: 两次保存之间的最短间隔（秒）
+        """
+        self.path = path
+        self.save_interval = save_interval
+        self._counts = Counter()
+        # 上次保存之后本进程新增的计数
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._saved_at = time.time()
+        self._saving = False
+        self._save_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='usage-profile')
+        self.load()
+
+    @staticmethod
+    def make_key(indicator, entities, start_year, end_year):
+        # 保留国家/地区的选择顺序：图表中的颜色按顺序分配，顺序不同的图表缓存键也不同
+        return indicator, tuple(entities), start_year, end_year
+
+    def _read(self):
+        """
+        :return: 文件中的使用记录（Counter），文件不存在或损坏时为空
+        """
+        counts = Counter()
+        try:
+            with open(self.path, 'r') as f:
+                rows = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return counts
+        for indicator, entities, start_year, end_year, count in rows:
+            counts[self.make_key(indicator, entities, start_year, end_year)] += count
+        return counts
+
+    def load(self):
+        """从文件读取使用记录，与内存中的计数合并"""
+        counts = self._read()
+        with self._lock:
+            self._counts.update(counts)
+
+    def record(self, indicators, entities, start_year, end_year):
+        """
+        记录一次查询，每个指标单独计数
+        """
+        with self._lock:
+            for indicator in indicators:
+                key = self.make_key(indicator, entities, start_year, end_year)
+                self._counts[key] += 1
+                self._pending[key] += 1
+            due = not self._saving and time.time() - self._saved_at >= self.save_interval
+            if due:
+                self._saving = True
+        if due:
+            self._save_executor.submit(self._save_in_background)
+
+    def _save_in_background(self):
+        try:
+            self.save()
+        except OSError as e:
+            print(f"保存使用记录失败: {e}")
+        finally:
+            with self._lock:
+                self._saving = False
+
+    def save(self):
+        """将本进程新增的计数合并到文件中（原子写入），并用合并后的结果更新内存中的计数"""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._saved_at = time.time()
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path + '.lock', 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            counts = self._read()
+            counts.update(pending)
+            rows = [[indicator, list(entities), start_year, end_year, count]
+                    for (indicator, entities, start_year, end_year), count in counts.items()]
+            atomic_write_json(self.path, rows)
+        with self._lock:
+            # 保存期间新增的计数仍未写入文件
+            counts.update(self._pending)
+            self._counts = counts
+
+    def top(self, k):
+        """
+        :return: 使用次数最多的 k 个组合，元素为 (indicator, entities, start_year, end_year)
+        """
+        with self._lock:
+            return [key for key, _ in self._counts.most_common(k)]
+
+
+class Prefetcher(threading.Thread):
+    """
+    后台预取线程：启动时以及之后每隔 interval 秒，预取并预渲染使用最多的 top_k 个组合
+    每个组合之间至少间隔 throttle 秒；有会话正在分析数据时暂停，避免与在线请求竞争
+    """
+    def __init__(self, web_page, profile, top_k=20, interval=3600, throttle=1.0, initial_delay=5):
+        """
+        :param web_page: WebPage 实例（使用其 data_manager、render_engine 和目录）
+        :param profile: UsageProfile
+        :param top_k: 每轮预取的组合数
+        :param interval: 两轮预取之间的间隔（秒）
+        :param throttle: 两个组合之间的最短间隔（秒）
+        :param initial_delay: 启动后第一轮预取前的等待时间（秒）
+        """
+        super().__init__(name='prefetcher', daemon=True)
+        self.web_page = web_page
+        self.profile = profile
+        self.top_k = top_k
+        self.interval = interval
+        self.throttle = throttle
+        self.initial_delay = initial_delay
+        self._stop_event = threading.Event()
+
+    def run(self):
+        delay = self.initial_delay
+        while not self._stop_event.wait(delay):
+            delay = self.interval
+            try:
+                self.prefetch_round()
+            except Exception as e:
+                print(f"预取失败: {e}")
+
+    def combinations(self):
+        """
+        本轮需要预取的组合：默认选项 + 使用最多的组合，按 (国家/地区集合, 年份范围) 合并指标，
+        这样同一组国家/地区的多个指标只需一次批量请求
+        """
+        indicators, entities, start_year, end_year = DEFAULT_QUERY
+        grouped = {(tuple(entities), start_year, end_year): list(indicators)}
+        for indicator, entities, start_year, end_year in self.profile.top(self.top_k):
+            group = grouped.setdefault((entities, start_year, end_year), [])
+            if indicator not in group:
+                group.append(indicator)
+        return [(indicators, list(entities), start_year, end_year)
+                for (entities, start_year, end_year), indicators in grouped.items()]
+
+    def prefetch_round(self):
+        """预取并预渲染一轮"""
+        from DataVisualizer import DataVisualizer
+        web_page = self.web_page
+        for indicators, entities, start_year, end_year in self.combinations():
+            if self._stop_event.is_set():
+                return
+            # 有在线分析请求时让路
+            while web_page.active_analyses > 0 and not self._stop_event.wait(self.throttle):
+                pass
+            indicators = [indicator for indicator in indicators if indicator in web_page.available_indicators]
+            entities = [entity for entity in entities if entity in web_page.available_entities]
+            if not indicators or not entities:
+                continue
+            data = web_page.data_manager.query_matrix(indicators, entities, list(range(start_year, end_year + 1)))
+            data_visualizer = DataVisualizer(data)
+            for indicator in indicators:
+                if not data.has_data(indicator):
+                    continue
+                info = web_page.available_indicators[indicator]
+                # 等待渲染完成后再继续，同一时间最多占用一个渲染进程
+                web_page.render_engine.submit(data_visualizer, indicator, info["label"], info["unit"], entities).result()
+            self._stop_event.wait(self.throttle)
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,235 @@
+import threading
+import time
+import numpy as np
+
+# 排名索引覆盖的年份范围
+RANKING_YEARS = list(range(1980, 2030))
+
+
+class CrossSection:
+    """
+    单个 (指标, 年份) 的横截面排序索引：各国家/地区的值按降序排列，并记录每个国家/地区的名次
+    并列的值名次相同（1224 排名法）
+    """
+    def __init__(self, entities, values):
+        """
+        :param entities: 有数据的国家/地区代码列表
+        :param values: 对应的值（numpy 数组）
+        """
+        order = np.argsort(-values, kind='stable')
+        self.entities = [entities[i] for i in order]
+        self.values = values[order]
+        # 名次 = 严格大于该值的数量 + 1
+        self.ranks = np.searchsorted(-self.values, -self.values, side='left') + 1
+        self.position = {entity: i for i, entity in enumerate(self.entities)}
+
+    def __len__(self):
+        return len(self.entities)
+
+    def top(self, n):
+        """
+        :return: 值最大的 n 个国家/地区，元素为 (名次, 国家/地区代码, 值)
+        """
+        return [(int(self.ranks[i]), self.entities[i], float(self.values[i])) for i in range(min(n, len(self)))]
+
+    def bottom(self, n):
+        """
+        :return: 值最小的 n 个国家/地区（从最小开始），元素为 (名次, 国家/地区代码, 值)
+        """
+        return [(int(self.ranks[i]), self.entities[i], float(self.values[i]))
+                for i in range(len(self) - 1, max(len(self) - n, 0) - 1, -1)]
+
+    def percentile(self, q):
+        """
+        :param q: 百分位（0~100）
+        :return: 对应的值（线性插值，与 numpy.percentile 一致），没有数据时为 None
+        """
+        if not len(self):
+            return None
+        # values 为降序，第 q 百分位在升序中的位置为 q/100*(n-1)
+        position = (100 - q) / 100 * (len(self) - 1)
+        lower = int(np.floor(position))
+        upper = min(lower + 1, len(self) - 1)
+        weight = position - lower
+        return float(self.values[lower] * (1 - weight) + self.values[upper] * weight)
+
+    def rank_of(self, entity):
+        """
+        :return: {'rank': 名次, 'total': 有数据的国家/地区数, 'value': 值, 'percentile': 低于该值的国家/地区占比(%)}，
+                 没有数据时为 None
+        """
+        i = self.position.get(entity)
+        if i is None:
+            return None
+        total = len(self)
+        below = total - int(np.searchsorted(-self.values, -self.values[i], side='right'))
+        return {
+            'rank': int(self.ranks[i]),
+            'total': total,
+            'value': float(self.values[i]),
+            'percentile': below / (total - 1) * 100 if total > 1 else 100.0,
+        }
+
+
+class RankingIndex:
+    """
+    全部国家/地区的横截面排名索引，按指标建立，每个年份一个 CrossSection
+    首次查询某个指标时通过 DataManager 获取全部国家/地区的数据（经由缓存）并建立索引；
+    观测值缓存写入新数据时只把受影响的 (指标, 年份) 标记为需要重建，下次查询时只重建这些年份；
+    其他进程写入共享缓存不会通知本进程，索引超过 max_age 秒后整体重建；
+    上游请求失败时先使用由缓存或快照补全的部分数据建立索引，retry_interval 秒内不再重新请求
+    """
+    def __init__(self, data_manager, basic_info_manager, years=None, max_age=3600, retry_interval=60):
+        """
+        :param data_manager: DataManager
+        :param basic_info_manager: BasicInfoManager，参与排名的是其目录中的国家/地区
+        :param years: 索引覆盖的年份，默认为 RANKING_YEARS
+        :param max_age: 索引的最长使用时间（秒）
+        :param retry_interval: 建立失败后再次请求的最短间隔（秒）
+        """
+        self.data_manager = data_manager
+        self.basic_info_manager = basic_info_manager
+        self.years = list(years or RANKING_YEARS)
+        self.max_age = max_age
+        self.retry_interval = retry_interval
+        self._sections = dict()
+        # 指标 -> 完整建立的时间；指标 -> 上次建立失败的时间；指标 -> 需要重建的年份；
+        # 指标 -> (依赖的原始指标, 回溯年数, 基期年份)
+        self._built = dict()
+        self._failed = dict()
+        self._dirty = dict()
+        self._dependencies = dict()
+        self._lock = threading.Lock()
+        data_manager.cache.add_listener(self._on_cache_write)
+
+    def _on_cache_write(self, indicator, years):
+        """
+        观测值缓存的写入回调：依赖该原始指标的已建立索引中，受影响的年份标记为需要重建
+        派生指标可能用到前几年的数据（如同比）或基期数据，对应的年份一并标记
+        """
+        with self._lock:
+            for code, (raw, lookback, base_years) in self._dependencies.items():
+                if indicator not in raw or code not in self._built:
+                    continue
+                if base_years.intersection(years):
+                    affected = set(self.years)
+                else:
+                    affected = {year + offset for year in years for offset in range(lookback + 1)}
+                self._dirty.setdefault(code, set()).update(affected.intersection(self.years))
+
+    def _pending(self, indicator):
+        """
+        :return: 需要（重新）建立的年份，不需要时为空列表
+        """
+        now = time.time()
+        with self._lock:
+            built_at = self._built.get(indicator)
+            failed_at = self._failed.get(indicator)
+            if (built_at is None or now - built_at > self.max_age) and \
+                    (failed_at is None or now - failed_at > self.retry_interval):
+                return list(self.years)
+            return sorted(self._dirty.get(indicator, ()))
+
+    def _query_args(self, indicator, years):
+        expression = self.data_manager.derived_engine.expressions.get(indicator)
+        dependencies = (set(expression.dependencies), expression.lookback, set(expression.base_years)) \
+            if expression else ({indicator}, 0, set())
+        with self._lock:
+            self._dependencies[indicator] = dependencies
+        return [indicator], list(self.basic_info_manager.available_entities), years
+
+    def _install(self, indicator, matrix, years, started):
+        """
+        由查询结果建立各年份的 CrossSection
+        :return: 上游请求失败时的错误信息
+        """
+        sections = dict()
+        values, mask = matrix.indicator_slice(indicator)
+        for year in years:
+            y = matrix.year_index.get(year)
+            if y is None:
+                sections[year] = CrossSection([], np.empty(0))
+                continue
+            valid = np.flatnonzero(mask[:, y])
+            sections[year] = CrossSection([matrix.entities[e] for e in valid], values[valid, y])
+        with self._lock:
+            for year, section in sections.items():
+                self._sections[(indicator, year)] = section
+            # 建立期间由本次查询写入缓存的数据已包含在结果中
+            dirty = self._dirty.get(indicator)
+            if dirty:
+                dirty.difference_update(years)
+            if matrix.error is not None:
+                self._failed[indicator] = time.time()
+            elif len(years) == len(self.years):
+                self._built[indicator] = started
+                self._failed.pop(indicator, None)
+        return matrix.error
+
+    def prepare(self, indicator):
+        """
+        确保指标的索引是最新的（可能发起请求）
+        :return: 上游请求失败时的错误信息，否则为 None
+        """
+        years = self._pending(indicator)
+        if not years:
+            return None
+        started = time.time()
+        matrix = self.data_manager.query_matrix(*self._query_args(indicator, years))
+        return self._install(indicator, matrix, years, started)
+
+    async def prepare_async(self, indicator):
+        """
+        prepare 的非阻塞版本
+        """
+        years = self._pending(indicator)
+        if not years:
+            return None
+        started = time.time()
+        matrix = await self.data_manager.query_matrix_async(*self._query_args(indicator, years))
+        return self._install(indicator, matrix, years, started)
+
+    def lookup(self, indicator, year):
+        """
+        读取已建立的索引，不发起请求（在事件循环中先 await prepare_async 再调用）
+        :return: (指标, 年份) 的 CrossSection，尚未建立或年份不在索引范围内时为 None
+        """
+        with self._lock:
+            return self._sections.get((indicator, year))
+
+    def section(self, indicator, year):
+        """
+        确保索引是最新的（可能阻塞请求）后读取
+        :return: (指标, 年份) 的 CrossSection，年份不在索引范围内时为 None
+        """
+        self.prepare(indicator)
+        return self.lookup(indicator, year)
+
+    def top(self, indicator, year, n=20):
+        """
+        :return: 值最大的 n 个国家/地区，元素为 (名次, 国家/地区代码, 值)
+        """
+        section = self.section(indicator, year)
+        return section.top(n) if section is not None else []
+
+    def bottom(self, indicator, year, n=20):
+        """
+        :return: 值最小的 n 个国家/地区，元素为 (名次, 国家/地区代码, 值)
+        """
+        section = self.section(indicator, year)
+        return section.bottom(n) if section is not None else []
+
+    def percentile(self, indicator, year, q):
+        """
+        :param q: 百分位（0~100）
+        :return: 对应的值，没有数据时为 None
+        """
+        section = self.section(indicator, year)
+        return section.percentile(q) if section is not None else None
+
+    def rank_of(self, indicator, year, entity):
+        """
+        :return: 国家/地区的名次信息（见 CrossSection.rank_of），没有数据时为 None
+        """
+        section = self.section(indicator, year)
+        return section.rank_of(entity) if section is not None else None
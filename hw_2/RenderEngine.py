@@ -0,0 +1,208 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from DataVisualizer import configure_fonts, render_chart, render_chart_timed
+from Metrics import STAGE_SECONDS
+from SingleFlight import SingleFlight
+
+
+def _warm_up():
+    """预热任务：让子进程提前完成导入和字体设置"""
+    return os.getpid()
+
+
+class RenderEngine:
+    """
+    基于常驻进程池的图表渲染引擎
+    每个子进程启动时设置一次字体，绘图任务在子进程中并行执行；
+    未完成的任务数受 max_pending 限制，超出时提交方等待；
+    缓存键相同的图表正在渲染时，后来的调用方等待同一个结果
+    """
+    def __init__(self, max_workers=None, max_pending=None, chart_cache=None, render_timeout=60):
+        """
+        :param max_workers: 渲染进程数，默认等于CPU核数
+        :param max_pending: 最多同时排队/执行的任务数，默认为进程数的4倍
+        :param chart_cache: 已渲染图表的缓存（ChartCache），为 None 时不缓存
+        :param render_timeout: render_async 等待渲染结果的超时时间（秒）
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 4
+        self.chart_cache = chart_cache
+        self.executor = self._create_executor()
+        self._executor_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self.render_timeout = render_timeout
+        self.render_flights = SingleFlight('render')
+
+    def _create_executor(self):
+        # 使用 spawn 启动子进程，避免继承主进程中的线程和数据库连接
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=configure_fonts,
+        )
+
+    def _replace_broken_executor(self, broken):
+        """
+        渲染子进程异常退出后进程池不再可用，换用新的进程池（已提交的任务以 BrokenProcessPool 失败）
+        """
+        with self._executor_lock:
+            if self.executor is broken:
+                print("警告: 渲染进程池已损坏，重新创建")
+                self.executor = self._create_executor()
+                broken.shutdown(wait=False)
+
+    def warm_up(self):
+        """
+        启动全部渲染进程，避免第一个请求承担进程启动开销
+        """
+        futures = [self.executor.submit(_warm_up) for _ in range(self.max_workers)]
+        for future in futures:
+            future.result()
+
+    def submit(self, data_visualizer, indicator, indicator_label, indicator_unit, entities, figsize=(10, 7),
+               fmt='png', max_points=None):
+        """
+        提交绘图任务，排队任务已满时阻塞
+        参数同 DataVisualizer.plot_data
+        :return: concurrent.futures.Future，结果为二进制图像数据
+        """
+        cache_key, job = data_visualizer.plot_job(indicator, indicator_label, indicator_unit, entities, figsize, fmt, max_points)
+        cached = self._cached(cache_key)
+        if cached is not None:
+            return cached
+        if fmt == 'svg':
+            return self._render_inline(cache_key, job)
+        future = self.render_flights.follow(cache_key)
+        if future is not None:
+            return future
+        self._slots.acquire()
+        return self._join(cache_key, job)
+
+    async def render_async(self, data_visualizer, indicator, indicator_label, indicator_unit, entities, figsize=(10, 7),
+                           fmt='png', max_points=None):
+        """
+        submit 的协程版本，排队任务已满时在线程中等待，不阻塞事件循环
+        等待超过 render_timeout 秒时抛出 TimeoutError（渲染任务本身继续执行，结果仍会写入缓存）
+        :return: 二进制图像数据
+        """
+        cache_key, job = data_visualizer.plot_job(indicator, indicator_label, indicator_unit, entities, figsize, fmt, max_points)
+        return await self.render_job_async(cache_key, job)
+
+    async def render_job_async(self, cache_key, job):
+        """
+        渲染已生成的绘图任务（如 DataVisualizer.bar_job 生成的排名条形图），缓存、合并和排队规则同 render_async
+        :return: 二进制图像数据
+        """
+        future = self._cached(cache_key)
+        if future is None and job['format'] == 'svg':
+            future = self._render_inline(cache_key, job)
+        if future is None:
+            future = self.render_flights.follow(cache_key)
+        if future is None:
+            await self._acquire_slot()
+            future = self._join(cache_key, job)
+        return await self.render_flights.wait_async(future, self.render_timeout)
+
+    async def _acquire_slot(self):
+        """
+        获取排队名额，已满时在线程中等待，不阻塞事件循环
+        线程中的等待无法取消：协程被取消（或超时）后线程取得的名额立即归还
+        """
+        if self._slots.acquire(blocking=False):
+            return
+        waiter = asyncio.get_event_loop().run_in_executor(None, self._slots.acquire)
+        try:
+            await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            waiter.add_done_callback(lambda _: self._slots.release())
+            raise
+
+    def _cached(self, cache_key):
+        """
+        查询图表缓存，命中时返回已完成的 Future
+        """
+        if self.chart_cache is None:
+            return None
+        img = self.chart_cache.get(cache_key)
+        if img is None:
+            return None
+        future = Future()
+        future.set_result(img)
+        return future
+
+    def _render_inline(self, cache_key, job):
+        """
+        SVG只是文本拼接，开销远小于进程间通信，直接在当前进程生成
+        :return: 已完成的 Future
+        """
+        future = Future()
+        timings = dict()
+        try:
+            img = render_chart(job, timings)
+        except Exception as e:
+            future.set_exception(e)
+            return future
+        for stage, seconds in timings.items():
+            STAGE_SECONDS.observe(seconds, stage=stage)
+        if self.chart_cache is not None:
+            self.chart_cache.put(cache_key, img)
+        future.set_result(img)
+        return future
+
+    def _join(self, cache_key, job):
+        """
+        提交任务，或加入相同缓存键的正在执行的任务（调用方已获取排队名额，加入已有任务或提交失败时归还）
+        """
+        try:
+            future, leader = self.render_flights.join(cache_key, lambda: self._submit_job(cache_key, job))
+        except BaseException:
+            self._slots.release()
+            raise
+        if not leader:
+            self._slots.release()
+        return future
+
+    def _submit_job(self, cache_key, job):
+        """
+        将任务提交到进程池（调用方已获取排队名额，任务完成时归还；提交失败时由 _join 归还）
+        :return: Future，结果为二进制图像数据
+        """
+        submitted = time.perf_counter()
+        executor = self.executor
+        try:
+            pool_future = executor.submit(render_chart_timed, job)
+        except BrokenProcessPool:
+            self._replace_broken_executor(executor)
+            pool_future = self.executor.submit(render_chart_timed, job)
+        future = Future()
+
+        def on_done(done):
+            self._slots.release()
+            if done.cancelled():
+                future.cancel()
+                return
+            if done.exception() is not None:
+                if isinstance(done.exception(), BrokenProcessPool):
+                    self._replace_broken_executor(executor)
+                future.set_exception(done.exception())
+                return
+            img, timings = done.result()
+            # 子进程中的阶段耗时在主进程记录；render 包含排队和进程间传输
+            for stage, seconds in timings.items():
+                STAGE_SECONDS.observe(seconds, stage=stage)
+            STAGE_SECONDS.observe(time.perf_counter() - submitted, stage='render')
+            if self.chart_cache is not None:
+                self.chart_cache.put(cache_key, img)
+            future.set_result(img)
+
+        pool_future.add_done_callback(on_done)
+        return future
+
+    def shutdown(self):
+        """关闭进程池"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,114 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    合并并发的相同请求：同一个键的任务执行期间，后来的调用方直接等待同一个结果，不再重复执行
+    任务失败时异常传递给所有等待方；等待超时只影响超时的调用方，任务本身继续执行
+    """
+    def __init__(self, name=''):
+        """
+        :param name: 名称，用于区分统计信息
+        """
+        self.name = name
+        self._inflight = dict()
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'executed': 0, 'deduplicated': 0, 'failures': 0, 'timeouts': 0}
+
+    def join(self, key, start):
+        """
+        加入键对应的任务，没有正在执行的任务时调用 start 启动
+        :param key: 任务键（可哈希）
+        :param start: 无参函数，返回 concurrent.futures.Future
+        :return: (Future, 是否由本次调用启动)
+        """
+        with self._lock:
+            self._stats['calls'] += 1
+            future = self._inflight.get(key)
+            if future is not None:
+                self._stats['deduplicated'] += 1
+                return future, False
+            future = start()
+            self._inflight[key] = future
+            self._stats['executed'] += 1
+        future.add_done_callback(lambda done: self._finish(key, done))
+        return future, True
+
+    def follow(self, key):
+        """
+        只加入正在执行的任务，不启动新任务
+        :return: 键对应的正在执行的任务，没有时返回 None
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self._stats['calls'] += 1
+                self._stats['deduplicated'] += 1
+            return future
+
+    def submit(self, key, executor, fn, *args):
+        """
+        在 executor 中执行 fn(*args)，相同键的并发调用共享同一个 Future
+        :return: concurrent.futures.Future
+        """
+        future, _ = self.join(key, lambda: executor.submit(fn, *args))
+        return future
+
+    def do(self, key, fn, *args, timeout=None):
+        """
+        同步版本：由第一个调用方在当前线程中执行 fn(*args)，其余调用方等待其结果
+        :param timeout: 等待其他调用方结果的超时时间（秒），为 None 时一直等待
+        :return: fn 的返回值
+        """
+        future, leader = self.join(key, Future)
+        if leader:
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            future.set_result(result)
+            return result
+        return self.wait(future, timeout)
+
+    def wait(self, future, timeout=None):
+        """
+        等待任务结果，超时时抛出 TimeoutError
+        """
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            self._count('timeouts')
+            raise
+
+    async def wait_async(self, future, timeout=None):
+        """
+        wait 的协程版本，超时或协程被取消时不会取消共享的任务
+        """
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except asyncio.TimeoutError:
+            self._count('timeouts')
+            raise
+
+    def stats(self):
+        """
+        :return: 统计信息 {'calls', 'executed', 'deduplicated', 'failures', 'timeouts', 'inflight'}
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['inflight'] = len(self._inflight)
+        return stats
+
+    def _finish(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            if future.cancelled() or future.exception() is not None:
+                self._stats['failures'] += 1
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
@@ -0,0 +1,291 @@
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+from CatalogStore import atomic_write_json
+from DataMatrix import ResultMatrix
+from StreamParser import IndicatorArrays, parse_values_stream
+
+# 快照的默认位置，可通过环境变量 IMF_SNAPSHOT_DIR 修改
+DEFAULT_SNAPSHOT_DIR = os.environ.get('IMF_SNAPSHOT_DIR') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'cache', 'snapshot')
+INDEX_FILE = 'index.json'
+
+
+class SnapshotStore:
+    """
+    全量数据的离线快照（只读）
+    数值保存为 float64 的 .npy 文件（指标 × 国家/地区 × 年份，NaN 表示没有数据），以只读内存映射方式打开：
+    启动时只读取标签索引，数据页按需加载，多个工作进程共享操作系统的页缓存
+    """
+    def __init__(self, directory=None):
+        """
+        :param directory: 快照目录，默认为 DEFAULT_SNAPSHOT_DIR
+        :raise FileNotFoundError: 快照不存在
+        """
+        self.directory = directory or DEFAULT_SNAPSHOT_DIR
+        self._lock = threading.Lock()
+        self._index_mtime = None
+        self.reload()
+
+    @staticmethod
+    def exists(directory=None):
+        return os.path.exists(os.path.join(directory or DEFAULT_SNAPSHOT_DIR, INDEX_FILE))
+
+    def reload(self):
+        """
+        重新读取索引并映射数据文件（快照被刷新后调用）
+        """
+        index_path = os.path.join(self.directory, INDEX_FILE)
+        for attempt in range(2):
+            with open(index_path, 'r') as f:
+                index = json.load(f)
+            try:
+                values = np.load(os.path.join(self.directory, index['values_file']), mmap_mode='r')
+                break
+            except FileNotFoundError:
+                # 读取索引后快照又被刷新了（不止一次），数据文件已删除：重新读取索引
+                if attempt:
+                    raise
+        with self._lock:
+            self.index = index
+            self.values = values
+            self.indicators = index['indicators']
+            self.entities = index['entities']
+            self.years = index['years']
+            self.indicator_index = {code: i for i, code in enumerate(self.indicators)}
+            self.entity_index = {code: i for i, code in enumerate(self.entities)}
+            self.year_index = {year: i for i, year in enumerate(self.years)}
+            self._index_mtime = os.path.getmtime(index_path)
+
+    def reload_if_changed(self):
+        """
+        :return: 快照是否已被刷新并重新加载
+        """
+        try:
+            mtime = os.path.getmtime(os.path.join(self.directory, INDEX_FILE))
+        except FileNotFoundError:
+            return False
+        if mtime == self._index_mtime:
+            return False
+        self.reload()
+        return True
+
+    def query(self, indicators, entities, years):
+        """
+        从快照中读取数据
+        :param indicators: 指标ID列表
+        :param entities: 国家/地区代码列表，为空时返回全部国家/地区
+        :param years: 年份列表，为空时返回全部年份
+        :return: ResultMatrix
+        """
+        with self._lock:
+            values = self.values
+            indicator_index, entity_index, year_index = self.indicator_index, self.entity_index, self.year_index
+            entities = list(entities) if entities else list(self.entities)
+            years = sorted(years) if years else list(self.years)
+        result = ResultMatrix(indicators, entities, years)
+        rows = [(i, indicator_index[code]) for i, code in enumerate(indicators) if code in indicator_index]
+        cols = [(e, entity_index[code]) for e, code in enumerate(entities) if code in entity_index]
+        year_cols = [(y, year_index[year]) for y, year in enumerate(years) if year in year_index]
+        if rows and cols and year_cols:
+            dst = np.ix_([i for i, _ in rows], [e for e, _ in cols], [y for y, _ in year_cols])
+            src = np.ix_([i for _, i in rows], [e for _, e in cols], [y for _, y in year_cols])
+            # 只有选中的部分从内存映射中读出
+            block = np.asarray(values[src], dtype=np.float64)
+            result.values[dst] = block
+            result.mask[dst] = ~np.isnan(block)
+        return result
+
+    def info(self):
+        """
+        :return: 快照概要
+        """
+        return {
+            'directory': self.directory,
+            'created_at': self.index.get('created_at'),
+            'indicators': len(self.indicators),
+            'entities': len(self.entities),
+            'years': f'{self.years[0]}-{self.years[-1]}' if self.years else '',
+            'cells': int(np.count_nonzero(~np.isnan(self.values))),
+            'bytes': os.path.getsize(os.path.join(self.directory, self.index['values_file'])),
+        }
+
+
+class SnapshotBuilder:
+    """
+    构建或增量刷新快照：每个指标一次请求（全部国家/地区、全部年份），
+    刷新时只请求过期或指定的指标，并使用条件请求（ETag / Last-Modified），其余指标直接沿用旧快照中的数据
+    """
+    def __init__(self, client, directory=None, max_workers=4):
+        """
+        :param client: ImfClient
+        :param directory: 快照目录，默认为 DEFAULT_SNAPSHOT_DIR
+        :param max_workers: 并发请求数（同时受客户端限流器约束）
+        """
+        self.client = client
+        self.directory = directory or DEFAULT_SNAPSHOT_DIR
+        self.max_workers = max_workers
+
+    def _fetch(self, indicator, meta):
+        """
+        请求单个指标的全部数据
+        :param meta: 旧快照中该指标的元数据，用于条件请求
+        :return: (IndicatorArrays，新的元数据)；内容未变化时数据为 None
+        """
+        headers = dict()
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        response = self.client.get(f'/{indicator}', headers=headers, stream=True)
+        new_meta = dict(meta, fetched_at=time.time())
+        if response.status_code == 304:
+            response.close()
+            return None, new_meta
+        new_meta.update(etag=response.headers.get('ETag'), last_modified=response.headers.get('Last-Modified'))
+        try:
+            values, _ = parse_values_stream(response)
+        except ValueError as e:
+            raise requests.exceptions.InvalidJSONError(f"无法解析的响应: {e}")
+        return values.get(indicator) or IndicatorArrays(), new_meta
+
+    def build(self, indicators, entities, refresh=None, max_age=None):
+        """
+        构建快照
+        :param indicators: 快照包含的全部指标
+        :param entities: 目录中的国家/地区（数据中出现的其他代码会追加在后面）
+        :param refresh: 需要重新请求的指标，为 None 时由 max_age 决定
+        :param max_age: 超过该时长（秒）的指标重新请求，为 None 时全部重新请求
+        :return: 快照概要
+        """
+        old = SnapshotStore(self.directory) if SnapshotStore.exists(self.directory) else None
+        old_meta = old.index.get('meta', {}) if old else {}
+        now = time.time()
+        if refresh is None:
+            refresh = [code for code in indicators
+                       if old is None or code not in old.indicator_index or max_age is None
+                       or now - old_meta.get(code, {}).get('fetched_at', 0) > max_age]
+        refresh = [code for code in indicators if code in set(refresh)]
+
+        fetched = dict()
+        meta = {code: old_meta[code] for code in indicators if code in old_meta}
+        failed = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {code: executor.submit(self._fetch, code, old_meta.get(code, {})) for code in refresh}
+            for done, (code, future) in enumerate(futures.items(), 1):
+                try:
+                    data, meta[code] = future.result()
+                except requests.exceptions.RequestException as e:
+                    print(f"请求错误: {code}: {e}")
+                    failed.append(code)
+                    continue
+                if data is not None:
+                    fetched[code] = data
+                print(f"[{done}/{len(refresh)}] {code}: {'未变化' if data is None else f'{len(data.entities)} 个国家/地区'}")
+
+        # 标签：目录中的国家/地区 + 数据中出现的其他代码；年份为连续区间
+        entity_list = list(entities)
+        known = set(entity_list)
+        years = set(old.years) if old else set()
+        for data in fetched.values():
+            for entity in data.entities:
+                if entity not in known:
+                    known.add(entity)
+                    entity_list.append(entity)
+            years.update(data.years)
+        if old:
+            entity_list += [code for code in old.entities if code not in known]
+        years = list(range(min(years), max(years) + 1)) if years else []
+
+        values = np.full((len(indicators), len(entity_list), len(years)), np.nan, dtype=np.float64)
+        year_index = {year: i for i, year in enumerate(years)}
+        entity_index = {code: i for i, code in enumerate(entity_list)}
+        for i, code in enumerate(indicators):
+            if code in fetched:
+                data = fetched[code]
+                if data.entities and data.years:
+                    values[i][np.ix_([entity_index[entity] for entity in data.entities],
+                                     [year_index[year] for year in data.years])] = data.values
+            elif old and code in old.indicator_index:
+                # 未重新请求（或未变化、请求失败）的指标沿用旧数据
+                copied = old.query([code], entity_list, years)
+                values[i] = copied.values[0]
+        return self._write(indicators, entity_list, years, values, meta, failed)
+
+    def _write(self, indicators, entities, years, values, meta, failed):
+        """
+        写入新的数据文件后原子替换索引；保留上一代数据文件（已读取旧索引、尚未映射数据文件的进程仍可打开），
+        删除更早的数据文件（已映射的进程不受影响）
+        """
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+        values_file = f'values-{int(time.time() * 1000)}.npy'
+        tmp_path = os.path.join(self.directory, values_file + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.save(f, values)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.directory, values_file))
+        previous = None
+        if os.path.exists(os.path.join(self.directory, INDEX_FILE)):
+            with open(os.path.join(self.directory, INDEX_FILE), 'r') as f:
+                previous = json.load(f).get('values_file')
+        index = {
+            'version': 1,
+            'created_at': time.time(),
+            'values_file': values_file,
+            'indicators': list(indicators),
+            'entities': list(entities),
+            'years': list(years),
+            'meta': meta,
+            'failed': failed,
+        }
+        atomic_write_json(os.path.join(self.directory, INDEX_FILE), index)
+        for name in os.listdir(self.directory):
+            if name.startswith('values-') and name.endswith('.npy') and name not in (values_file, previous):
+                os.remove(os.path.join(self.directory, name))
+        return SnapshotStore(self.directory).info()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='IMF数据离线快照')
+    parser.add_argument('--dir', default=None, help=f'快照目录（默认 {DEFAULT_SNAPSHOT_DIR}）')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help='构建或增量刷新快照')
+    build_parser.add_argument('--indicators', nargs='*', help='只重新请求这些指标（默认按 --max-age 判断）')
+    build_parser.add_argument('--max-age', type=float, default=None,
+                              help='只重新请求超过该时长（小时）的指标，默认全部重新请求')
+    build_parser.add_argument('--workers', type=int, default=4, help='并发请求数')
+    subparsers.add_parser('info', help='显示快照概要')
+    query_parser = subparsers.add_parser('query', help='从快照中查询数据')
+    query_parser.add_argument('indicator')
+    query_parser.add_argument('entities', nargs='+')
+    query_parser.add_argument('--start-year', type=int, default=1980)
+    query_parser.add_argument('--end-year', type=int, default=2029)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        from DataManager import BasicInfoManager
+        basic_info_manager = BasicInfoManager()
+        # 派生指标由原始指标计算，不放入快照
+        indicators = [code for code in basic_info_manager.available_indicators
+                      if code and not basic_info_manager.derived_engine.is_derived(code)]
+        builder = SnapshotBuilder(basic_info_manager.client, args.dir, args.workers)
+        max_age = args.max_age * 3600 if args.max_age is not None else None
+        print(json.dumps(builder.build(indicators, list(basic_info_manager.available_entities),
+                                       refresh=args.indicators, max_age=max_age), indent=2))
+    elif args.command == 'info':
+        print(json.dumps(SnapshotStore(args.dir).info(), indent=2))
+    else:
+        matrix = SnapshotStore(args.dir).query([args.indicator], args.entities,
+                                               list(range(args.start_year, args.end_year + 1)))
+        print(json.dumps(matrix.to_dict(), ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
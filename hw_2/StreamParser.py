@@ -0,0 +1,229 @@
+import json
+import re
+import numpy as np
+
+# datamapper 响应的结构：{"values": {指标: {国家/地区: {年份: 值}}}, "api": {...}}
+# 国家/地区对象中只有数字和 null，没有嵌套对象或包含括号的字符串，找到下一个 '}' 即为对象结束
+_VALUES_KEY = re.compile(rb'"values"\s*:\s*\{')
+_KEY_OBJECT = re.compile(rb'"((?:[^"\\]|\\.)*)"\s*:\s*\{')
+_SEPARATORS = b' \t\r\n,'
+# 等待更多数据时，键前缀最多允许的长度，超过则视为格式错误
+_MAX_KEY_BYTES = 4096
+
+
+class IndicatorArrays:
+    """
+    单个指标的解析结果：float64 数组（国家/地区 × 年份）和有效值掩码
+    指定了国家/地区或年份时数组按其预先分配，不在其中的数据直接跳过；未指定时按出现顺序追加，容量按倍数增长
+    """
+    def __init__(self, entities=None, years=None):
+        """
+        :param entities: 需要的国家/地区代码列表，为空时保留全部
+        :param years: 需要的年份列表，为空时保留全部
+        """
+        self.fixed_entities = bool(entities)
+        self.fixed_years = bool(years)
+        self.entities = list(entities) if entities else []
+        self.years = sorted(years) if years else []
+        self.entity_index = {code: i for i, code in enumerate(self.entities)}
+        self.year_index = {year: i for i, year in enumerate(self.years)}
+        self._columns = dict()
+        shape = (len(self.entities) or 64, len(self.years) or 64)
+        self.values = np.full(shape, np.nan, dtype=np.float64)
+        self.mask = np.zeros(shape, dtype=bool)
+
+    def wants(self, entity):
+        return not self.fixed_entities or entity in self.entity_index
+
+    def _grow(self, rows, cols):
+        old_rows, old_cols = self.values.shape
+        if rows <= old_rows and cols <= old_cols:
+            return
+        shape = (max(rows, old_rows * 2 if rows > old_rows else old_rows),
+                 max(cols, old_cols * 2 if cols > old_cols else old_cols))
+        values = np.full(shape, np.nan, dtype=np.float64)
+        mask = np.zeros(shape, dtype=bool)
+        values[:old_rows, :old_cols] = self.values
+        mask[:old_rows, :old_cols] = self.mask
+        self.values, self.mask = values, mask
+
+    def _year_column(self, year):
+        """
+        :param year: 响应中的年份字符串
+        :return: 年份所在的列，不需要的年份为 -1
+        """
+        year = int(year)
+        col = self.year_index.get(year)
+        if col is None:
+            if self.fixed_years:
+                return -1
+            col = self.year_index[year] = len(self.years)
+            self.years.append(year)
+            self._grow(0, col + 1)
+        return col
+
+    def add(self, entity, series):
+        """
+        写入一个国家/地区的数据
+        :param series: {年份字符串: 值}，值为 None 表示没有数据
+        """
+        row = self.entity_index.get(entity)
+        if row is None:
+            if self.fixed_entities:
+                return
+            row = self.entity_index[entity] = len(self.entities)
+            self.entities.append(entity)
+            self._grow(row + 1, 0)
+        # 各国家/地区的年份键通常相同：按键的组合缓存对应的列，数值整行转换后一次写入（None 转换为 NaN）
+        keys = tuple(series)
+        columns = self._columns.get(keys)
+        if columns is None:
+            columns = np.array([self._year_column(year) for year in keys], dtype=np.int64)
+            keep = columns >= 0
+            columns = self._columns[keys] = (columns[keep], keep if not keep.all() else None)
+        cols, keep = columns
+        values = np.array(list(series.values()), dtype=np.float64)
+        if keep is not None:
+            values = values[keep]
+        valid = ~np.isnan(values)
+        self.values[row, cols[valid]] = values[valid]
+        self.mask[row, cols[valid]] = True
+
+    def finish(self):
+        """
+        截去多分配的容量，未预先指定的年份按升序排列
+        """
+        self.values = self.values[:len(self.entities), :len(self.years)]
+        self.mask = self.mask[:len(self.entities), :len(self.years)]
+        if not self.fixed_years and self.years != sorted(self.years):
+            order = np.argsort(self.years)
+            self.years = [self.years[i] for i in order]
+            self.year_index = {year: i for i, year in enumerate(self.years)}
+            self.values = self.values[:, order]
+            self.mask = self.mask[:, order]
+
+    def cells(self):
+        """
+        :return: 生成器，产生有效的 (entity, year, value) 单元格
+        """
+        for e, y in zip(*np.nonzero(self.mask)):
+            yield self.entities[e], self.years[y], float(self.values[e, y])
+
+
+class ValuesStreamParser:
+    """
+    datamapper 数据响应的增量解析器：逐块输入响应体，每读完一个国家/地区对象即写入数值数组，
+    不需要的国家/地区不解码，已处理的字节随即丢弃，内存占用与结果大小和单个国家/地区对象有关，与响应体大小无关
+    """
+    _SEEK_VALUES, _INDICATOR, _ENTITY, _DONE = range(4)
+
+    def __init__(self, entities=None, years=None):
+        """
+        :param entities: 需要的国家/地区代码列表，为空时保留全部
+        :param years: 需要的年份列表，为空时保留全部
+        """
+        self.entities = entities
+        self.years = years
+        self.results = dict()
+        self.bytes_read = 0
+        self._buffer = bytearray()
+        self._state = self._SEEK_VALUES
+        self._current = None
+        self._is_object = None
+
+    def feed(self, chunk):
+        """
+        输入一块响应体
+        :raise ValueError: 响应格式不符合预期
+        """
+        self.bytes_read += len(chunk)
+        if self._is_object is None and chunk.strip():
+            self._is_object = chunk.lstrip()[:1] == b'{'
+        if self._state == self._DONE:
+            return
+        self._buffer += chunk
+        pos = self._parse(self._buffer)
+        del self._buffer[:pos]
+
+    def close(self):
+        """
+        结束输入
+        :return: {indicator: IndicatorArrays}
+        :raise ValueError: 响应不完整
+        """
+        if not self._is_object:
+            raise ValueError("响应体不是JSON对象")
+        # 没有 values 键的JSON对象视为没有数据
+        if self._state not in (self._DONE, self._SEEK_VALUES):
+            raise ValueError("响应体不完整")
+        for arrays in self.results.values():
+            arrays.finish()
+        return self.results
+
+    @staticmethod
+    def _skip(buffer, pos):
+        end = len(buffer)
+        while pos < end and buffer[pos] in _SEPARATORS:
+            pos += 1
+        return pos
+
+    def _parse(self, buffer):
+        """
+        从缓冲区开头尽量多地解析
+        :return: 已处理的字节数
+        """
+        pos = 0
+        while True:
+            if self._state == self._SEEK_VALUES:
+                match = _VALUES_KEY.search(buffer, pos)
+                if match is None:
+                    # 保留末尾可能被截断的键
+                    return max(pos, len(buffer) - 32)
+                pos = match.end()
+                self._state = self._INDICATOR
+            elif self._state == self._DONE:
+                return len(buffer)
+            else:
+                pos = self._skip(buffer, pos)
+                if pos >= len(buffer):
+                    return pos
+                if buffer[pos] == ord('}'):
+                    # 指标对象结束，或 values 对象结束（其余内容不需要）
+                    self._state = self._INDICATOR if self._state == self._ENTITY else self._DONE
+                    pos += 1
+                    continue
+                match = _KEY_OBJECT.match(buffer, pos)
+                if match is None:
+                    if len(buffer) - pos > _MAX_KEY_BYTES or buffer[pos] != ord('"'):
+                        raise ValueError(f"无法解析的响应内容: {bytes(buffer[pos:pos + 40])!r}")
+                    return pos
+                key = match.group(1).decode('utf-8')
+                if self._state == self._INDICATOR:
+                    self._current = self.results[key] = IndicatorArrays(self.entities, self.years)
+                    self._state = self._ENTITY
+                    pos = match.end()
+                    continue
+                end = buffer.find(b'}', match.end())
+                if end < 0:
+                    # 国家/地区对象还没有读完
+                    return pos
+                if self._current.wants(key):
+                    self._current.add(key, json.loads(bytes(buffer[match.end() - 1:end + 1])))
+                pos = end + 1
+
+
+def parse_values_stream(response, entities=None, years=None, chunk_size=64 * 1024):
+    """
+    以流式方式解析 datamapper 数据响应（requests 的 stream=True 响应）
+    :param entities: 需要的国家/地区代码列表，为空时保留全部
+    :param years: 需要的年份列表，为空时保留全部
+    :return: ({indicator: IndicatorArrays}, 响应体字节数)
+    :raise ValueError: 响应格式不符合预期
+    """
+    parser = ValuesStreamParser(entities, years)
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            parser.feed(chunk)
+    finally:
+        response.close()
+    return parser.close(), parser.bytes_read
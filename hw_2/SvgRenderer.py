@@ -0,0 +1,197 @@
+import math
+from html import escape
+import numpy as np
+
+# matplotlib tab10 调色板，PNG 和 SVG 图表共用（参与图表缓存键，修改后旧图表自动失效）
+TAB10 = ('#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd',
+         '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf')
+
+
+def series_color(idx):
+    """
+    :param idx: 国家/地区在选择中的位置
+    :return: 对应折线的颜色，两种格式的图表颜色相同
+    """
+    return TAB10[idx % len(TAB10)]
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets 降采样，保留折线的整体形状
+    :param x: 横坐标数组（升序）
+    :param y: 纵坐标数组
+    :param threshold: 降采样后的点数
+    :return: (x, y) 降采样后的两个数组
+    """
+    n = len(x)
+    if threshold is None or threshold >= n or threshold < 3:
+        return x, y
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    bucket_size = (n - 2) / (threshold - 2)
+    sampled = np.empty(threshold, dtype=np.int64)
+    sampled[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        # 下一个桶的平均点
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        sampled[i + 1] = a
+    sampled[-1] = n - 1
+    return x[sampled], y[sampled]
+
+
+def _nice_ticks(low, high, count=6):
+    """
+    计算美观的刻度值
+    :return: 刻度列表
+    """
+    if low == high:
+        low, high = low - 1, high + 1
+    raw_step = (high - low) / count
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    for factor in (1, 2, 2.5, 5, 10):
+        step = factor * magnitude
+        if step >= raw_step:
+            break
+    first = math.floor(low / step) * step
+    last = math.ceil(high / step) * step
+    return [first + i * step for i in range(int(round((last - first) / step)) + 1)]
+
+
+def _fmt(value):
+    """坐标保留一位小数，减小输出体积"""
+    return f'{value:.1f}'.rstrip('0').rstrip('.')
+
+
+def render_svg(job, width=860, height=600):
+    """
+    根据绘图任务生成紧凑的SVG图表，输出大小只与实际绘制的点数有关
+    :param job: DataVisualizer.plot_job 生成的绘图任务（字典），max_points 不为空时对每条折线降采样
+    :param width: 画布宽度（像素）
+    :param height: 画布高度（像素）
+    :return: SVG文本（UTF-8编码的二进制数据）
+    """
+    left, right, top, bottom = 70, 150, 70, 60
+    plot_w = width - left - right
+    plot_h = height - top - bottom
+    min_year, max_year = job['min_year'], job['max_year']
+    series = [(idx, entity) + lttb(years, values, job.get('max_points'))
+              for idx, entity, years, values in job['series']]
+    y_low = min(float(values.min()) for _, _, _, values in series)
+    y_high = max(float(values.max()) for _, _, _, values in series)
+    y_ticks = _nice_ticks(y_low, y_high)
+    y_low, y_high = y_ticks[0], y_ticks[-1]
+    x_span = max(max_year - min_year, 1)
+
+    def sx(year):
+        return left + (year - min_year) / x_span * plot_w
+
+    def sy(value):
+        return top + (y_high - value) / (y_high - y_low) * plot_h
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" width="100%" '
+        f'font-family="SimHei,sans-serif" font-size="12">',
+        f'<text x="{width / 2}" y="24" text-anchor="middle" font-size="16" font-weight="bold">'
+        f'指标: {escape(job["indicator"])} ({escape(job["indicator_label"])})</text>',
+        f'<text x="{width / 2}" y="44" text-anchor="middle" font-size="13">单位: {escape(job["indicator_unit"])}</text>',
+    ]
+    # 网格和坐标轴刻度
+    grid = []
+    labels = []
+    for tick in y_ticks:
+        y = _fmt(sy(tick))
+        grid.append(f'M{left} {y}h{plot_w}')
+        labels.append(f'<text x="{left - 6}" y="{y}" text-anchor="end" dy="4">{tick:g}</text>')
+    years = range(min_year, max_year + 1)
+    step = max(1, math.ceil(len(years) / 15))
+    for year in years[::step]:
+        x = _fmt(sx(year))
+        grid.append(f'M{x} {top}v{plot_h}')
+        labels.append(f'<text x="{x}" y="{top + plot_h + 18}" text-anchor="middle">{year}</text>')
+    parts.append(f'<path d="{"".join(grid)}" stroke="#ccc" stroke-dasharray="4 3" fill="none"/>')
+    parts.append(f'<rect x="{left}" y="{top}" width="{plot_w}" height="{plot_h}" fill="none" stroke="#333"/>')
+    parts.extend(labels)
+    parts.append(f'<text x="{left + plot_w / 2}" y="{height - 14}" text-anchor="middle" font-size="13">年份</text>')
+    parts.append(f'<text transform="translate(18 {top + plot_h / 2}) rotate(-90)" text-anchor="middle" font-size="13">指标值</text>')
+
+    # 折线、数据点和数据标签
+    show_labels = len(years) <= 15
+    for idx, entity, xs, ys in series:
+        color = series_color(idx)
+        points = ' '.join(f'{_fmt(sx(x))},{_fmt(sy(y))}' for x, y in zip(xs, ys))
+        parts.append(f'<polyline points="{points}" fill="none" stroke="{color}" stroke-width="2.5"/>')
+        if len(xs) <= 60:
+            parts.append(f'<g fill="{color}">' + ''.join(
+                f'<circle cx="{_fmt(sx(x))}" cy="{_fmt(sy(y))}" r="4"/>' for x, y in zip(xs, ys)) + '</g>')
+        if show_labels:
+            parts.append('<g font-size="10" text-anchor="middle">' + ''.join(
+                f'<text x="{_fmt(sx(x))}" y="{_fmt(sy(y) + (-8 if y >= 0 else 16))}">{y:.2f}</text>'
+                for x, y in zip(xs, ys)) + '</g>')
+
+    # 图例
+    legend_x = left + plot_w + 16
+    parts.append(f'<text x="{legend_x}" y="{top + 4}" font-weight="bold">国家/地区</text>')
+    for row, (idx, entity, _, _) in enumerate(series):
+        y = top + 22 + row * 18
+        parts.append(f'<path d="M{legend_x} {y - 4}h18" stroke="{series_color(idx)}" stroke-width="3"/>'
+                     f'<text x="{legend_x + 24}" y="{y}">{escape(entity)}</text>')
+    parts.append('</svg>')
+    return ''.join(parts).encode('utf-8')
+
+
+def render_bar_svg(job, width=860):
+    """
+    根据 DataVisualizer.bar_job 生成的任务绘制水平条形图，高度随条目数增加
+    :param job: 排名条形图任务（字典）
+    :param width: 画布宽度（像素）
+    :return: SVG文本（UTF-8编码的二进制数据）
+    """
+    bars = job['bars']
+    left, right, top, bottom = 220, 70, 70, 50
+    row_h = 20
+    plot_w = width - left - right
+    plot_h = row_h * len(bars)
+    height = top + plot_h + bottom
+    values = [value for _, _, _, value, _ in bars]
+    x_ticks = _nice_ticks(min(0.0, min(values)), max(0.0, max(values)))
+    x_low, x_high = x_ticks[0], x_ticks[-1]
+
+    def sx(value):
+        return left + (value - x_low) / (x_high - x_low) * plot_w
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" width="100%" '
+        f'font-family="SimHei,sans-serif" font-size="12">',
+        f'<text x="{width / 2}" y="24" text-anchor="middle" font-size="16" font-weight="bold">'
+        f'指标: {escape(job["indicator"])} ({escape(job["indicator_label"])})</text>',
+        f'<text x="{width / 2}" y="44" text-anchor="middle" font-size="13">'
+        f'{escape(job["title"])}  单位: {escape(job["indicator_unit"])}</text>',
+    ]
+    grid = []
+    labels = []
+    for tick in x_ticks:
+        x = _fmt(sx(tick))
+        grid.append(f'M{x} {top}v{plot_h}')
+        labels.append(f'<text x="{x}" y="{top + plot_h + 18}" text-anchor="middle">{tick:g}</text>')
+    parts.append(f'<path d="{"".join(grid)}" stroke="#ccc" stroke-dasharray="4 3" fill="none"/>')
+    parts.extend(labels)
+    zero = sx(0.0)
+    for row, (rank, _, label, value, highlighted) in enumerate(bars):
+        y = top + row * row_h
+        x0, x1 = sorted((zero, sx(value)))
+        color = TAB10[1] if highlighted else TAB10[0]
+        parts.append(f'<rect x="{_fmt(x0)}" y="{y + 3}" width="{_fmt(max(x1 - x0, 0.5))}" height="{row_h - 6}" fill="{color}"/>')
+        parts.append(f'<text x="{left - 6}" y="{y + row_h - 6}" text-anchor="end">{rank}. {escape(label)}</text>')
+        anchor, dx = ('start', 4) if value >= 0 else ('end', -4)
+        parts.append(f'<text x="{_fmt(sx(value) + dx)}" y="{y + row_h - 6}" text-anchor="{anchor}" font-size="10">{value:.2f}</text>')
+    parts.append(f'<path d="M{_fmt(zero)} {top}v{plot_h}" stroke="#333"/>')
+    parts.append(f'<text x="{left + plot_w / 2}" y="{height - 10}" text-anchor="middle" font-size="13">指标值</text>')
+    parts.append('</svg>')
+    return ''.join(parts).encode('utf-8')
@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+import tornado.ioloop
+import tornado.web
+
+
+# 导出生成器在独立的线程池中执行：生成器内部会等待 fetch_executor 中的请求任务，
+# 若占用 fetch_executor 的线程，并发导出可能占满线程池，使等待的请求任务无法执行
+EXPORT_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix='imf-export')
+
+
+class ExportHandler(tornado.web.RequestHandler):
+    """
+    数据导出接口：GET /export?indicator=NGDP_RPCH&indicator=LP&entity=USA&start_year=1980&end_year=2029
+    不指定 entity 时导出全部国家/地区；响应以分块方式逐批写出，不在内存中构建整张表
+    """
+    def initialize(self, web_page):
+        self.web_page = web_page
+
+    async def get(self):
+        basic_info_manager = self.web_page.basic_info_manager
+        indicators = self.get_arguments('indicator')
+        entities = self.get_arguments('entity')
+        try:
+            start_year = int(self.get_argument('start_year', 1980))
+            end_year = int(self.get_argument('end_year', 2029))
+        except ValueError:
+            raise tornado.web.HTTPError(400, '年份参数错误')
+        if not indicators or any(indicator not in basic_info_manager.available_indicators for indicator in indicators):
+            raise tornado.web.HTTPError(400, '指标参数错误')
+        if any(entity not in basic_info_manager.available_entities for entity in entities):
+            raise tornado.web.HTTPError(400, '国家/地区参数错误')
+        if not 1980 <= start_year <= end_year <= 2029:
+            raise tornado.web.HTTPError(400, '年份范围错误')
+
+        # 全部国家/地区按目录展开，使导出同样经过观测值缓存（不指定国家/地区的查询无法使用缓存）
+        entities = entities or list(basic_info_manager.available_entities)
+
+        self.set_header('Content-Type', 'text/csv; charset=utf-8')
+        self.set_header('Content-Disposition', f'attachment; filename="imf_{start_year}_{end_year}.csv"')
+        chunks = self.web_page.data_manager.iter_export_csv(indicators, entities, list(range(start_year, end_year + 1)))
+        loop = tornado.ioloop.IOLoop.current()
+        # 生成器内部会请求API，在线程池中取下一块，避免阻塞事件循环
+        while True:
+            chunk = await loop.run_in_executor(EXPORT_EXECUTOR, next, chunks, None)
+            if chunk is None:
+                break
+            self.write(chunk)
+            await self.flush()
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    """
+    Prometheus 文本格式的指标接口：GET /metrics
+    """
+    def initialize(self, registry):
+        self.registry = registry
+
+    def get(self):
+        self.set_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.write(self.registry.render())
@@ -1,53 +1,185 @@
-from pywebio import start_server,config
+from pywebio import config
+from pywebio.platform.tornado import webio_handler
+from pywebio.utils import STATIC_PATH
+import tornado.httpserver
+import tornado.ioloop
+import tornado.netutil
+import tornado.process
+import tornado.web
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlencode
 from pywebio.input import *
 from pywebio.output import *
-from pywebio.pin import put_select, put_slider, put_actions, get_pin_values, pin_wait_change
-from pywebio.session import run_async
+from pywebio.pin import put_input, put_select, put_slider, put_radio, put_actions, get_pin_values, pin_wait_change, pin, pin_update, pin_on_change
+from pywebio.session import run_async, defer_call, local as session_local
 from DataManager import BasicInfoManager, DataManager
 from DataVisualizer import DataVisualizer
+from DerivedIndicators import DerivedEngine
+from ChartCache import ChartCache
+from RenderEngine import RenderEngine
+from WebHandlers import ExportHandler, MetricsHandler
+from Metrics import REGISTRY, STAGE_SECONDS, PAYLOAD_BYTES, ACTIVE_SESSIONS
+from Prefetcher import UsageProfile, Prefetcher
+from AnalysisSession import AnalysisSession
+from RankingIndex import RankingIndex
 import time 
+import os
+import asyncio
 class WebPage:
-    def __init__(self):
-        """Web应用初始化"""
-        self.basic_info_manager = BasicInfoManager()
+    # SVG 图表中每条折线最多绘制的点数
+    SVG_MAX_POINTS = 40
+    # 下拉框中一次最多显示的候选条目数
+    CATALOG_PAGE_SIZE = 30
+
+    def __init__(self, worker_id=None, workers=1):
+        """
+        Web应用初始化
+        多进程运行时每个工作进程在 fork 之后各自创建 WebPage：数据库连接、渲染进程池和后台线程都不跨进程共享，
+        观测值缓存（SQLite）、目录文件、图表磁盘缓存和使用记录通过本地文件共享
+        :param worker_id: 工作进程编号，单进程运行时为 None；只有 0 号进程向API刷新目录和执行预取
+        :param workers: 工作进程总数
+        """
+        self.worker_id = worker_id
+        self.workers = workers
+        leader = worker_id in (None, 0)
+        # 派生指标（人均GDP、增长率等）作为伪指标出现在指标列表中，由已有数据计算
+        self.derived_engine = DerivedEngine()
+        self.basic_info_manager = BasicInfoManager(derived_engine=self.derived_engine)
         print("BasicInfoManager initialized")
-        self.data_manager = DataManager()
+        self.data_manager = DataManager(derived_engine=self.derived_engine)
         print("DataManager initialized")
-        self.available_indicators = self.basic_info_manager.available_indicators
-        self.available_entities = self.basic_info_manager.available_entities
+        # 全部国家/地区的横截面排名索引，缓存写入新数据时增量重建
+        self.ranking_index = RankingIndex(self.data_manager, self.basic_info_manager)
+        # 目录在后台刷新，不阻塞启动和正在进行的会话；离线模式下只重新读取本地目录
+        # 其他工作进程只加载 0 号进程写入的新版本
+        self.basic_info_manager.start_refresher(fetch_remote=leader and not self.data_manager.offline)
+        # 已渲染图表的缓存，内存放不下的写入磁盘
+        self.chart_cache = ChartCache(
+            max_bytes=64 * 2 ** 20,
+            spill_dir=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'charts'),
+            write_through=workers > 1,
+        )
+        # 图表在常驻进程池中并行渲染，CPU核数在各工作进程之间平分
+        self.render_engine = RenderEngine(max_workers=max(1, (os.cpu_count() or 1) // workers),
+                                          chart_cache=self.chart_cache)
+        self.render_engine.warm_up()
+        print("RenderEngine initialized")
+        # 记录查询组合的使用次数，后台预取并预渲染最常用的组合
+        self.active_analyses = 0
+        self.usage_profile = UsageProfile(
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'usage_profile.json')
+        )
+        self.prefetcher = None
+        if leader:
+            self.prefetcher = Prefetcher(self, self.usage_profile)
+            self.prefetcher.start()
+        # 其他组件已有的统计信息在导出指标时采集
+        REGISTRY.add_collector(self._collect_metrics)
         
+    @property
+    def available_indicators(self):
+        return self.basic_info_manager.available_indicators
+
+    @property
+    def available_entities(self):
+        return self.basic_info_manager.available_entities
+
     async def main_app(self):
         """主应用界面"""
         config(title="IMF经济数据可视化分析", description="IMF经济数据可视化分析", theme='default')
+        # 每个会话只计数一次
+        if not session_local.counted:
+            session_local.counted = True
+            ACTIVE_SESSIONS.inc()
+            defer_call(ACTIVE_SESSIONS.dec)
         clear(scope='input')
         clear(scope='result')
         
-        # 初始化 created_scopes
-        if not hasattr(self, 'created_scopes'):
-            self.created_scopes = set()
+        # 已创建的 scope 属于会话状态，保存在 session.local 中（WebPage 实例由所有会话共享）
+        if session_local.created_scopes is None:
+            session_local.created_scopes = set()
         
         # 创建 input scope
-        if 'input' not in self.created_scopes:
+        if 'input' not in session_local.created_scopes:
             put_scope('input')
-            self.created_scopes.add('input')
+            session_local.created_scopes.add('input')
         
-        # 在 input scope 中输出标题和各个 pin 控件
+        self._put_form()
+
+        # 提交后表单保留：调整选项再次提交时只获取新增的数据，只重新渲染输入变化的图表
+        session_local.analysis = AnalysisSession(self.data_manager, self.derived_engine)
+        while True:
+            await pin_wait_change(['actions'])
+            # 获取用户选择
+            form_data = await get_pin_values(['indicator', 'entities', 'start_year', 'end_year', 'chart_format',
+                                              'rank_order', 'rank_size', 'actions'])
+            # 检查并处理输入数据
+            if form_data.get("actions") not in ("analyze", "rank", "export", "export_all"):
+                continue
+            if not form_data.get("indicator"):
+                toast("请至少选择一个指标", color='error')
+                continue
+            if not form_data.get("entities") and form_data.get("actions") not in ("rank", "export_all"):
+                toast("请至少选择一个国家/地区", color='error')
+                continue
+            if not (form_data.get("start_year") and form_data.get("end_year")):
+                toast("请至少选择一个年份", color='error')
+                continue
+            if form_data.get("start_year") > form_data.get("end_year"):
+                toast("起始年份不能大于结束年份", color='error')
+                continue
+            self._put_result_layout()
+            if form_data["actions"] in ("export", "export_all"):
+                self._show_export_link(form_data)
+                continue
+            if form_data["actions"] == "rank":
+                self.active_analyses += 1
+                try:
+                    await self._rank(form_data)
+                finally:
+                    self.active_analyses -= 1
+                continue
+            self.usage_profile.record(form_data["indicator"], form_data["entities"],
+                                      form_data["start_year"], form_data["end_year"])
+            # 处理分析请求：在线程池中获取数据，不阻塞其他会话
+            # 分析进行期间后台预取暂停
+            self.active_analyses += 1
+            try:
+                await self._analyze(session_local.analysis, form_data)
+            finally:
+                self.active_analyses -= 1
+
+    def _put_form(self):
+        """
+        在 input scope 中输出标题和各个 pin 控件
+        """
         put_markdown("# IMF经济数据可视化分析", scope='input')
-        # 指标选择（多选，下拉列表）
+        # 指标选择（多选，下拉列表）：只下发已选条目和少量候选，其余通过搜索获取
+        put_input("indicator_search",
+                  label="搜索指标（代码或名称）",
+                  placeholder="如: GDP、NGDP_RPCH",
+                  scope="input")
         put_select("indicator", 
                    label="选择指标（可多选）",
-                   options=[{'label': info['label'], 'value': k} for k, info in self.available_indicators.items()],
+                   options=self.basic_info_manager.indicator_index.options_for('', ['NGDP_RPCH', 'LP'], self.CATALOG_PAGE_SIZE),
                    multiple=True,
                    value=['NGDP_RPCH', 'LP'],
                    scope="input")
         
         # 国家/地区选择（多选，下拉列表）
+        put_input("entity_search",
+                  label="搜索国家/地区（代码或名称）",
+                  placeholder="如: China、USA",
+                  scope="input")
         put_select("entities",
                    label="选择国家/地区（可多选）",
-                   options=[{'label': info['label'], 'value': k} for k, info in self.available_entities.items()],
+                   options=self.basic_info_manager.entity_index.options_for('', ['USA', 'CHN'], self.CATALOG_PAGE_SIZE),
                    multiple=True,
                    value=['USA', 'CHN'],
                    scope="input")
+        # 输入搜索词时在服务端检索，只更新匹配的选项
+        pin_on_change("indicator_search", onchange=self._typeahead('indicator', 'indicator_index'), clear=True)
+        pin_on_change("entity_search", onchange=self._typeahead('entities', 'entity_index'), clear=True)
         
         # 年份范围选择：采用两个滑块分别选择起始和结束年份
         put_slider("start_year",
@@ -66,76 +198,291 @@ class WebPage:
                    value=2029,
                    scope="input")
         
-        # 动作按钮：分析数据
+        # 图表格式：PNG图片或轻量的SVG矢量图
+        put_radio("chart_format",
+                  label="图表格式",
+                  options=[{'label': 'PNG 图片', 'value': 'png'},
+                           {'label': 'SVG 矢量图（轻量）', 'value': 'svg'}],
+                  value='png',
+                  inline=True,
+                  scope="input")
+        
+        # 排名：所选指标在结束年份的全部国家/地区排名
+        put_radio("rank_order",
+                  label="排名方式",
+                  options=[{'label': '最高', 'value': 'top'}, {'label': '最低', 'value': 'bottom'}],
+                  value='top',
+                  inline=True,
+                  scope="input")
+
+        put_slider("rank_size",
+                   label="排名显示的国家/地区数",
+                   min_value=5,
+                   max_value=50,
+                   step=5,
+                   value=20,
+                   scope="input")
+        
+        # 动作按钮：分析数据、排名、导出数据
         put_actions("actions",
                     label="",
                     buttons=[
-                        {'label': '分析数据', 'value': 'analyze','type': 'submit'}
+                        {'label': '分析数据', 'value': 'analyze','type': 'submit'},
+                        {'label': '排名（结束年份）', 'value': 'rank', 'type': 'submit', 'color': 'info'},
+                        {'label': '导出数据 (CSV)', 'value': 'export', 'type': 'submit', 'color': 'secondary'},
+                        {'label': '导出全部国家/地区 (CSV)', 'value': 'export_all', 'type': 'submit', 'color': 'secondary'},
                     ],
                     scope="input")
-        changed = await pin_wait_change(['actions'])
-        # 获取用户选择
-        form_data = await get_pin_values(['indicator', 'entities', 'start_year', 'end_year', 'actions'])
-        # 检查并处理输入数据
-        if form_data.get("actions") != "analyze":
-            return
-        if not form_data.get("indicator"):
-            toast("请至少选择一个指标", color='error')
-            return
-        if not form_data.get("entities"):
-            toast("请至少选择一个国家/地区", color='error')
-            return
-        if not (form_data.get("start_year") and form_data.get("end_year")):
-            toast("请至少选择一个年份", color='error')
-            return
-        if form_data.get("start_year") > form_data.get("end_year"):
-            toast("起始年份不能大于结束年份", color='error')
+
+    def _reset(self):
+        """
+        重置选项：恢复默认选择，清空结果区域和会话中的数据
+        """
+        clear(scope='input')
+        self._put_form()
+        if 'result' in session_local.created_scopes:
+            remove('result')
+            session_local.created_scopes.discard('result')
+        session_local.analysis = AnalysisSession(self.data_manager, self.derived_engine)
+
+    def _put_result_layout(self):
+        """
+        创建结果区域（每次进入 main_app 只创建一次）：警告、图表、导出链接和重置按钮
+        """
+        if 'result' in session_local.created_scopes:
             return
-        # 构造年份范围列表
-        start_year = form_data["start_year"]
-        end_year = form_data["end_year"]
-        years = list(range(start_year, end_year + 1))
-        
-        # 创建 result scope 
-        if 'result' not in self.created_scopes:
-            put_scope('result')
-            self.created_scopes.add('result')
-        
-        # 处理分析请求并生成图表、显示结果
-        with put_loading('border', color='primary', scope='result'):
-            imgs = list()
-            all_warnings = []
-            for indicator in form_data["indicator"]:
-                data = self.data_manager.query_data(
-                    indicator,
-                    form_data["entities"],
-                    sorted(years)
-                )
-                # 如果查询数据中包含警告信息，则加入 all_warnings
-                if data and "_warnings" in data:
-                    all_warnings.extend(data["_warnings"])
-                data_visualizer = DataVisualizer(data)
-                indicator_label = self.basic_info_manager.available_indicators[indicator]["label"]
-                indicator_unit = self.basic_info_manager.available_indicators[indicator]["unit"]
-                imgs.append(
-                    data_visualizer.plot_data(
-                        indicator,
-                        indicator_label,
-                        indicator_unit,
-                        form_data["entities"],
-                    )
-                )
+        put_scope('result')
+        session_local.created_scopes.add('result')
         put_markdown("## 分析结果", scope='result')
-        if all_warnings:
-            for warn in all_warnings:
-                put_text(warn, scope='result')
-        for img in imgs:
-            put_image(img, format='png', width='90%', scope='result').show()
-        
-        # 添加重置选项按钮
-        put_button("重置选项", onclick=lambda: run_async(self.main_app()), scope='result')
+        put_scope('warnings', scope='result')
+        put_scope('charts', scope='result')
+        put_scope('ranking', scope='result')
+        put_scope('export', scope='result')
+        # 重置选项：清空会话中的数据和图表，重新开始
+        put_button("重置选项", onclick=self._reset, scope='result')
+
+    async def _analyze(self, analysis, form_data):
+        """
+        增量分析：获取会话中还没有的数据，截取所选年份，只重新渲染输入变化的图表（就地替换）
+        :param analysis: 当前会话的 AnalysisSession
+        """
+        indicators = form_data["indicator"]
+        entities = form_data["entities"]
+        chart_format = form_data.get("chart_format") or 'png'
+        max_points = self.SVG_MAX_POINTS if chart_format == 'svg' else None
+        with use_scope('warnings', clear=True):
+            with put_loading('border', color='primary'):
+                await analysis.update(indicators, entities)
+            data = analysis.view(indicators, entities, form_data["start_year"], form_data["end_year"])
+            # 如果查询数据中包含警告信息，则逐条显示
+            for warn in data.warnings:
+                put_text(warn)
+
+        for scope in analysis.drop_charts(indicators):
+            remove(scope)
+        # 图表在渲染进程池中生成，完成一个显示一个；输入没有变化的图表保持不动
+        data_visualizer = DataVisualizer(data, derived_engine=self.derived_engine)
+        tasks = []
+        for indicator in indicators:
+            info = self.available_indicators[indicator]
+            try:
+                key, _ = data_visualizer.plot_job(indicator, info["label"], info["unit"], entities,
+                                                  fmt=chart_format, max_points=max_points)
+            except ValueError as e:
+                key = str(e)
+            scope, created = analysis.chart_scope(indicator)
+            if created:
+                put_scope(scope, scope='charts')
+            if not analysis.chart_changed(indicator, key):
+                continue
+            # 图表键在渲染完成后才记录，渲染超时或失败的图表在下次提交时重新渲染
+            analysis.chart_keys.pop(indicator, None)
+            clear(scope=scope)
+            put_loading('border', color='primary', scope=scope)
+            tasks.append(self._render_chart(data_visualizer, scope, indicator, entities, chart_format, key))
+        for future in asyncio.as_completed(tasks):
+            scope, indicator, img, error, key = await future
+            clear(scope=scope)
+            if key is not None:
+                analysis.chart_keys[indicator] = key
+            if error:
+                put_error(error, scope=scope)
+            else:
+                PAYLOAD_BYTES.observe(len(img), kind=f'chart_{chart_format}')
+                with STAGE_SECONDS.time(stage='put_image'):
+                    if chart_format == 'svg':
+                        put_html(img.decode('utf-8'), scope=scope)
+                    else:
+                        put_image(img, format='png', width='90%', scope=scope)
+
+    async def _rank(self, form_data):
+        """
+        排名：所选指标在结束年份的全部国家/地区排名（条形图），以及所选国家/地区的名次和百分位
+        """
+        year = form_data["end_year"]
+        size = form_data.get("rank_size") or 20
+        order = form_data.get("rank_order") or 'top'
+        chart_format = form_data.get("chart_format") or 'png'
+        with use_scope('ranking', clear=True):
+            put_markdown(f"## {year}年排名")
+            for indicator in form_data["indicator"]:
+                info = self.available_indicators[indicator]
+                with put_loading('border', color='primary'):
+                    error = await self.ranking_index.prepare_async(indicator)
+                if error:
+                    put_text(f"警告: {error}，排名可能不完整")
+                section = self.ranking_index.lookup(indicator, year)
+                if section is None or not len(section):
+                    put_error(f"指标 {indicator} 在 {year} 年没有数据")
+                    continue
+                ranked = section.top(size) if order == 'top' else section.bottom(size)
+                bars = [(rank, entity, self._entity_label(entity), value) for rank, entity, value in ranked]
+                title = f"{year}年 {'最高' if order == 'top' else '最低'}{len(bars)}名（共{len(section)}个国家/地区）"
+                cache_key, job = DataVisualizer.bar_job(indicator, info["label"], info["unit"], title, bars,
+                                                        highlight=form_data.get("entities") or (),
+                                                        figsize=(10, max(5, 0.3 * len(bars) + 2)), fmt=chart_format)
+                try:
+                    img = await self.render_engine.render_job_async(cache_key, job)
+                except ValueError as e:
+                    put_error(str(e))
+                    continue
+                except (asyncio.TimeoutError, BrokenProcessPool):
+                    put_error(f"指标 {indicator} 的排名图渲染失败，请重新提交")
+                    continue
+                if chart_format == 'svg':
+                    put_html(img.decode('utf-8'))
+                else:
+                    put_image(img, format='png', width='90%')
+                # 分布概况和所选国家/地区的名次
+                put_text("分布: " + "，".join(f"{name} {section.percentile(q):.2f}" for name, q in
+                                             (('P10', 10), ('P25', 25), ('中位数', 50), ('P75', 75), ('P90', 90))))
+                rows = []
+                for entity in form_data.get("entities") or ():
+                    position = section.rank_of(entity)
+                    if position is None:
+                        rows.append([self._entity_label(entity), '-', '没有数据', '-'])
+                    else:
+                        rows.append([self._entity_label(entity), f"{position['rank']} / {position['total']}",
+                                     f"{position['value']:.2f}", f"{position['percentile']:.1f}%"])
+                if rows:
+                    put_table(rows, header=['国家/地区', '名次', '指标值', '百分位'])
+
+    def _entity_label(self, entity):
+        return self.available_entities.get(entity, {}).get('label', entity)
 
-    def get_available_port(self):
+    def _typeahead(self, select_name, index_name):
+        """
+        生成搜索框的回调：按搜索词更新下拉选项，已选中的条目保持选中
+        :param select_name: 下拉框的 pin 名称
+        :param index_name: BasicInfoManager 上的目录索引属性名
+        """
+        async def on_change(query):
+            selected = await pin[select_name] or []
+            catalog_index = getattr(self.basic_info_manager, index_name)
+            pin_update(select_name,
+                       options=catalog_index.options_for(query or '', selected, self.CATALOG_PAGE_SIZE),
+                       value=selected)
+        return on_change
+
+    async def _render_chart(self, data_visualizer, scope, indicator, entities, chart_format='png', key=None):
+        """
+        渲染单个指标的图表
+        :param scope: 图表所在的 scope，原样返回
+        :param chart_format: 'png' 或 'svg'，SVG 模式下每条折线最多绘制 SVG_MAX_POINTS 个点
+        :param key: 图表的缓存键（或不能绘制时的错误信息）
+        :return: (scope, indicator, 二进制图像数据, 错误信息, 可以记录的图表键)，
+                 渲染超时或渲染进程异常退出时图表键为 None，下次提交时重试
+        """
+        indicator_label = self.available_indicators[indicator]["label"]
+        indicator_unit = self.available_indicators[indicator]["unit"]
+        max_points = self.SVG_MAX_POINTS if chart_format == 'svg' else None
+        try:
+            img = await self.render_engine.render_async(data_visualizer, indicator, indicator_label, indicator_unit, entities,
+                                                        fmt=chart_format, max_points=max_points)
+        except ValueError as e:
+            return scope, indicator, None, str(e), key
+        except asyncio.TimeoutError:
+            return scope, indicator, None, f"指标 {indicator} 的图表渲染超时，请重新提交", None
+        except BrokenProcessPool:
+            return scope, indicator, None, f"指标 {indicator} 的图表渲染失败（渲染进程异常退出），请重新提交", None
+        return scope, indicator, img, None, key
+
+    def _show_export_link(self, form_data):
+        """
+        在结果区域显示导出链接，数据由 /export 接口以流式方式返回
+        """
+        query = [('indicator', indicator) for indicator in form_data["indicator"]]
+        if form_data["actions"] == "export":
+            query += [('entity', entity) for entity in form_data["entities"]]
+        query += [('start_year', form_data["start_year"]), ('end_year', form_data["end_year"])]
+        with use_scope('export', clear=True):
+            put_markdown("## 数据导出")
+            put_link("下载CSV文件", url='/export?' + urlencode(query), new_window=True)
+
+    def _collect_metrics(self):
+        """
+        采集单飞合并、渲染引擎和图表缓存的统计信息
+        :return: [(指标名, 类型, 说明, [(标签字典, 值)])]
+        """
+        flights = []
+        for flight in (self.data_manager.fetch_flights, self.render_engine.render_flights):
+            for kind, value in flight.stats().items():
+                if kind != 'inflight':
+                    flights.append(({'flight': flight.name, 'kind': kind}, value))
+        inflight = [({'flight': flight.name}, flight.stats()['inflight'])
+                    for flight in (self.data_manager.fetch_flights, self.render_engine.render_flights)]
+        return [
+            ('imf_singleflight_calls_total', 'counter', '单飞合并的调用统计', flights),
+            ('imf_singleflight_inflight', 'gauge', '正在执行的合并任务数', inflight),
+            ('imf_chart_cache_bytes', 'gauge', '内存中图表缓存的字节数', [({}, self.chart_cache.memory_bytes)]),
+            ('imf_active_analyses', 'gauge', '正在进行的分析请求数', [({}, self.active_analyses)]),
+            # 多进程运行时 /metrics 由任意一个工作进程回答，以此区分
+            ('imf_worker_info', 'gauge', '回答本次请求的工作进程',
+             [({'worker': '' if self.worker_id is None else self.worker_id, 'pid': os.getpid()}, 1)]),
+        ]
+
+    async def admin_app(self):
+        """管理面板：按阶段汇总的耗时和各项计数"""
+        config(title="IMF经济数据可视化分析 - 运行状态")
+        put_markdown("# 运行状态")
+        if not REGISTRY.enabled:
+            put_warning("指标记录已关闭（IMF_METRICS=0）")
+        rows = []
+        for (stage,) in STAGE_SECONDS.label_values():
+            count, total, median = STAGE_SECONDS.summary(stage=stage)
+            rows.append([stage, count, f"{total / count * 1000:.1f}" if count else '-',
+                         f"≤{median * 1000:g}" if median not in (None, float('inf')) else '-'])
+        put_markdown("## 各阶段耗时")
+        put_table(rows, header=['阶段', '次数', '平均 (ms)', '中位数 (ms)'])
+        put_markdown("## 全部指标")
+        put_code(REGISTRY.render(), language='text')
+        put_button("刷新", onclick=lambda: run_async(self._refresh_admin()))
+
+    async def _refresh_admin(self):
+        clear()
+        await self.admin_app()
+
+    def make_app(self, admin_panel=None):
+        """
+        创建 Tornado 应用：PyWebIO 页面、数据导出接口、指标接口以及 PyWebIO 前端静态文件
+        :param admin_panel: 是否启用 /admin 管理面板，默认由环境变量 IMF_ADMIN_PANEL=1 开启
+        """
+        if admin_panel is None:
+            admin_panel = os.environ.get('IMF_ADMIN_PANEL') == '1'
+        handlers = [
+            (r"/", webio_handler(self.main_app)),
+            (r"/export", ExportHandler, dict(web_page=self)),
+            (r"/metrics", MetricsHandler, dict(registry=REGISTRY)),
+        ]
+        if admin_panel:
+            handlers.append((r"/admin", webio_handler(self.admin_app)))
+        handlers += [
+            (r"/(.*)", tornado.web.StaticFileHandler, {"path": STATIC_PATH, 'default_filename': 'index.html'}),
+        ]
+        return tornado.web.Application(handlers=handlers, websocket_ping_interval=30)
+
+    @staticmethod
+    def get_available_port():
         """获取可用端口"""
         import socket
         port = 8081
@@ -146,7 +493,31 @@ class WebPage:
                 port += 1
         return port
     
-    def run(self):
-        """启动Web应用"""
-        port = self.get_available_port()
-        start_server(self.main_app, port, debug=True)
\ No newline at end of file
+    def run(self, port=None):
+        """启动Web应用（单进程）"""
+        port = port or self.get_available_port()
+        app = self.make_app()
+        app.listen(port, max_buffer_size=2 ** 20 * 200)
+        print(f"Running on http://localhost:{port}/")
+        tornado.ioloop.IOLoop.current().start()
+
+    @classmethod
+    def serve(cls, workers=0, port=None):
+        """
+        多进程运行：主进程绑定端口后 fork 出 workers 个工作进程，由内核在各进程之间分配连接
+        PyWebIO 会话建立在单个 WebSocket 连接上，会话状态始终留在同一个进程中；
+        工作进程异常退出时由主进程重新启动（仅支持 Unix）
+        :param workers: 工作进程数，0 表示CPU核数
+        :param port: 端口，默认自动选择
+        """
+        port = port or cls.get_available_port()
+        # 必须在创建任何线程、连接和 IOLoop 之前绑定端口并 fork
+        sockets = tornado.netutil.bind_sockets(port)
+        workers = workers or tornado.process.cpu_count()
+        print(f"Running on http://localhost:{port}/ with {workers} workers")
+        worker_id = tornado.process.fork_processes(workers)
+        web_page = cls(worker_id=worker_id, workers=workers)
+        server = tornado.httpserver.HTTPServer(web_page.make_app(), max_buffer_size=2 ** 20 * 200)
+        server.add_sockets(sockets)
+        print(f"Worker {worker_id} (pid {os.getpid()}) started")
+        tornado.ioloop.IOLoop.current().start()
\ No newline at end of file
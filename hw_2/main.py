@@ -1,12 +1,20 @@
+import argparse
+import os
 from WebPage import WebPage
 
 def main():
     """主函数"""
-    # 创建WebPage实例并运行
-    web_page = WebPage()
-    web_page.run()
+    parser = argparse.ArgumentParser(description='IMF经济数据可视化分析')
+    parser.add_argument('--port', type=int, default=None, help='端口，默认自动选择')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('IMF_WORKERS', '1')),
+                        help='工作进程数，1 为单进程运行，0 为CPU核数（默认读取环境变量 IMF_WORKERS）')
+    args = parser.parse_args()
+    if args.workers == 1:
+        # 创建WebPage实例并运行
+        web_page = WebPage()
+        web_page.run(args.port)
+    else:
+        WebPage.serve(args.workers, args.port)
     
 if __name__ == "__main__":
     main()
-
-
@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from DataCache import ObservationCache
+
+
+class ObservationCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('DataCache.time.time', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'observations.sqlite3')
+
+    def make_cache(self, **kwargs):
+        cache = ObservationCache(self.path, **kwargs)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_round_trip_with_negative_cells(self):
+        cache = self.make_cache()
+        cache.put_cells('NGDP_RPCH', [('USA', 2020, 1.5), ('CHN', 2020, None)])
+        self.assertEqual(cache.get_cells('NGDP_RPCH', ['USA', 'CHN', 'DEU'], [2020, 2021]),
+                         {('USA', 2020): 1.5, ('CHN', 2020): None})
+
+    def test_only_requested_years_are_returned(self):
+        cache = self.make_cache()
+        cache.put_cells('LP', [('USA', year, float(year)) for year in range(2000, 2010)])
+        self.assertEqual(set(cache.get_cells('LP', ['USA'], [2001, 2005])), {('USA', 2001), ('USA', 2005)})
+
+    def test_expired_cells_are_missing_unless_stale_allowed(self):
+        cache = self.make_cache(ttl=60)
+        cache.put_cells('LP', [('USA', 2020, 1.0)])
+        self.now += 61
+        self.assertEqual(cache.get_cells('LP', ['USA'], [2020]), {})
+        self.assertEqual(cache.get_cells('LP', ['USA'], [2020], allow_stale=True), {('USA', 2020): 1.0})
+
+    def test_purge_expired(self):
+        cache = self.make_cache(ttl=60)
+        cache.put_cells('LP', [('USA', 2020, 1.0)])
+        self.now += 30
+        cache.put_cells('LP', [('CHN', 2020, 2.0)])
+        self.now += 31
+        self.assertEqual(cache.purge_expired(), 1)
+        self.assertEqual(cache.get_cells('LP', ['USA', 'CHN'], [2020], allow_stale=True), {('CHN', 2020): 2.0})
+
+    def test_eviction_keeps_recently_read_cells(self):
+        cache = self.make_cache(max_cells=3)
+        cache.put_cells('LP', [('USA', 2020, 1.0), ('CHN', 2020, 2.0), ('DEU', 2020, 3.0)])
+        self.now += 1
+        # 读取只记录在内存中，写入时先写回再淘汰
+        cache.get_cells('LP', ['USA'], [2020])
+        self.now += 1
+        cache.put_cells('LP', [('JPN', 2020, 4.0)])
+        remaining = cache.get_cells('LP', ['USA', 'CHN', 'DEU', 'JPN'], [2020])
+        self.assertEqual(set(remaining), {('USA', 2020), ('DEU', 2020), ('JPN', 2020)})
+
+    def test_touches_are_flushed_on_close(self):
+        cache = ObservationCache(self.path)
+        cache.put_cells('LP', [('USA', 2020, 1.0)])
+        self.now += 10
+        cache.get_cells('LP', ['USA'], [2020])
+        cache.close()
+        reopened = self.make_cache()
+        accessed_at = reopened._conn.execute("SELECT accessed_at FROM observations").fetchone()[0]
+        self.assertEqual(accessed_at, self.now)
+
+    def test_listeners_receive_written_years(self):
+        cache = self.make_cache()
+        calls = []
+        cache.add_listener(lambda indicator, years: calls.append((indicator, years)))
+        cache.put_cells('LP', [('USA', 2020, 1.0), ('CHN', 2021, None)])
+        cache.put_cells('LP', [])
+        self.assertEqual(calls, [('LP', {2020, 2021})])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from urllib.parse import urlencode
+import requests
+from DataManager import DataManager
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def iter_content(self, chunk_size=None):
+        for i in range(0, len(self.payload), chunk_size):
+            yield self.payload[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+
+class FakeClient:
+    """
+    记录请求的 ImfClient 替身，数值由 (指标, 国家/地区, 年份) 确定
+    """
+    base_url = 'https://www.imf.org/external/datamapper/api/v1'
+
+    def __init__(self, indicators, fail=False):
+        self.indicators = set(indicators)
+        self.fail = fail
+        self.requests = []
+
+    @staticmethod
+    def value(indicator, entity, year):
+        return len(indicator) * 1000 + sum(map(ord, entity)) + year / 10000
+
+    def get(self, path, params=None, headers=None, stream=False):
+        self.requests.append((path, params))
+        if self.fail:
+            raise requests.exceptions.ConnectionError("down")
+        parts = [part for part in path.split('/') if part]
+        indicators = [part for part in parts if part in self.indicators]
+        entities = [part for part in parts if part not in self.indicators]
+        years = [int(year) for year in params['periods'].split(',')]
+        body = {'values': {indicator: {entity: {str(year): self.value(indicator, entity, year) for year in years}
+                                       for entity in entities} for indicator in indicators}}
+        return FakeResponse(json.dumps(body).encode('utf-8'))
+
+
+class DataManagerTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.cache_path = os.path.join(directory, 'observations.sqlite3')
+
+    def make_manager(self, client, **kwargs):
+        manager = DataManager(cache_path=self.cache_path, client=client, **kwargs)
+        self.addCleanup(manager.fetch_executor.shutdown)
+        self.addCleanup(manager.cache.close)
+        return manager
+
+    def url_length(self, manager, indicators, entities, years):
+        url = manager.base_url + '/' + '/'.join(list(indicators) + list(entities))
+        if years:
+            url += '?' + urlencode({'periods': ','.join(map(str, years))})
+        return len(url)
+
+    def test_small_query_is_a_single_request(self):
+        manager = self.make_manager(FakeClient([]))
+        plans = manager._plan_requests(['NGDP_RPCH', 'LP'], ['USA', 'CHN'], [2019, 2020])
+        self.assertEqual(plans, [(['NGDP_RPCH', 'LP'], ['USA', 'CHN'])])
+
+    def test_long_queries_are_split_below_the_url_limit(self):
+        manager = self.make_manager(FakeClient([]))
+        indicators = [f'IND_{i:03d}' for i in range(300)]
+        entities = [f'E{i:03d}' for i in range(600)]
+        # 指标过多时只拆分指标；国家/地区过多时按指标逐个拆分国家/地区
+        for indicator_count, entity_count, years in ((300, 10, list(range(1980, 2030))),
+                                                     (5, 600, list(range(1980, 2030))), (5, 600, [])):
+            with self.subTest(indicators=indicator_count, entities=entity_count, years=len(years)):
+                plans = manager._plan_requests(indicators[:indicator_count], entities[:entity_count], years)
+                self.assertGreater(len(plans), 1)
+                pairs = [(indicator, entity) for chunk_indicators, chunk_entities in plans
+                         for indicator in chunk_indicators for entity in chunk_entities]
+                # 每个 (指标, 国家/地区) 组合恰好请求一次
+                self.assertEqual(sorted(pairs), sorted((i, e) for i in indicators[:indicator_count]
+                                                       for e in entities[:entity_count]))
+                for chunk_indicators, chunk_entities in plans:
+                    self.assertLessEqual(self.url_length(manager, chunk_indicators, chunk_entities, years),
+                                         manager.MAX_URL_LENGTH)
+
+    def test_cached_cells_are_not_requested_again(self):
+        client = FakeClient(['NGDP_RPCH', 'LP'])
+        manager = self.make_manager(client)
+        years = list(range(2015, 2021))
+        first = manager.query_matrix(['NGDP_RPCH', 'LP'], ['USA', 'CHN'], years)
+        self.assertEqual(len(client.requests), 1)
+        self.assertIsNone(first.error)
+        second = manager.query_matrix(['NGDP_RPCH'], ['USA'], years[2:])
+        self.assertEqual(len(client.requests), 1)
+        self.assertEqual(second.series('NGDP_RPCH', 'USA')[1][0], FakeClient.value('NGDP_RPCH', 'USA', 2017))
+        manager.query_matrix(['NGDP_RPCH'], ['USA', 'DEU'], years)
+        self.assertEqual(client.requests[-1][0], '/NGDP_RPCH/DEU')
+
+    def test_upstream_failure_falls_back_to_stale_cache(self):
+        manager = self.make_manager(FakeClient(['LP']))
+        manager.query_matrix(['LP'], ['USA'], [2020])
+        down = self.make_manager(FakeClient(['LP'], fail=True), cache_ttl=0)
+        result = down.query_matrix(['LP'], ['USA', 'CHN'], [2020])
+        self.assertIsNotNone(result.error)
+        self.assertEqual(result.series('LP', 'USA')[1][0], FakeClient.value('LP', 'USA', 2020))
+        self.assertFalse(result.mask[0, 1].any())
+
+
+if __name__ == '__main__':
+    unittest.main()
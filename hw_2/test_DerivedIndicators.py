@@ -0,0 +1,86 @@
+import unittest
+import numpy as np
+from DataMatrix import ResultMatrix
+from DerivedIndicators import DerivedEngine, Expression
+
+
+def matrix(indicators, entities, years, values):
+    result = ResultMatrix(indicators, entities, years)
+    result.values[:] = np.asarray(values, dtype=np.float64)
+    result.mask[:] = ~np.isnan(result.values)
+    return result
+
+
+class ExpressionTest(unittest.TestCase):
+    def test_dependencies_and_lookback(self):
+        cases = {
+            'NGDPD * 1000 / LP': (['NGDPD', 'LP'], 0),
+            'yoy(NGDPD)': (['NGDPD'], 1),
+            'pct_change(LP, 3)': (['LP'], 3),
+            'rolling_mean(NGDP_RPCH, 5)': (['NGDP_RPCH'], 4),
+            'yoy(rolling_mean(NGDP_RPCH, 3))': (['NGDP_RPCH'], 3),
+            '-abs(diff(LP)) ** 2': (['LP'], 1),
+        }
+        for source, (dependencies, lookback) in cases.items():
+            with self.subTest(source=source):
+                expression = Expression(source)
+                self.assertEqual(expression.dependencies, dependencies)
+                self.assertEqual(expression.lookback, lookback)
+
+    def test_index_to_records_base_year(self):
+        self.assertEqual(Expression('index_to(NGDPD, 2000)').base_years, {2000})
+
+    def test_only_whitelisted_syntax_is_accepted(self):
+        for source in ("__import__('os').system('true')", 'NGDPD.real', 'open(LP)', 'LP if NGDPD else 0',
+                       'lambda: LP', 'NGDPD[0]', 'yoy(LP, 2)', 'rolling_mean(LP)', 'rolling_mean(LP, -1)',
+                       'rolling_mean(LP, 2.5)', "LP + 'x'", 'NGDPD // LP', 'yoy(x=LP)', 'LP +'):
+            with self.subTest(source=source):
+                with self.assertRaises(ValueError):
+                    Expression(source)
+
+    def test_invalid_results_become_nan(self):
+        data = matrix(['A', 'B'], ['USA'], [2000, 2001], [[[1.0, 2.0]], [[0.0, 4.0]]])
+        np.testing.assert_array_equal(Expression('A / B').evaluate(data), [[np.nan, 0.5]])
+
+
+class DerivedEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = DerivedEngine()
+
+    def test_plan_extends_years_for_lookback_and_base_year(self):
+        self.assertEqual(self.engine.plan(['D_NGDPD_YOY'], [2000, 2001, 2002]), (['NGDPD'], [1999, 2000, 2001, 2002]))
+        self.assertEqual(self.engine.plan(['D_NGDP_RPCH_MA5'], [2010]), (['NGDP_RPCH'], list(range(2006, 2011))))
+        raw, years = self.engine.plan(['D_NGDPD_IDX2000', 'LP'], [2010, 2012])
+        self.assertEqual(raw, ['NGDPD', 'LP'])
+        self.assertEqual(years, list(range(2000, 2013)))
+
+    def test_plan_merges_dependencies(self):
+        raw, years = self.engine.plan(['D_NGDPD_PC', 'D_LP_YOY', 'NGDPD'], [])
+        self.assertEqual(raw, ['NGDPD', 'LP'])
+        self.assertEqual(years, [])
+
+    def test_evaluate_trims_to_requested_years(self):
+        raw, years = self.engine.plan(['D_NGDPD_YOY', 'NGDPD'], [2001, 2002])
+        data = matrix(raw, ['USA', 'CHN'], years, [[[100.0, 110.0, 121.0], [50.0, np.nan, 60.0]]])
+        result = self.engine.evaluate(data, ['D_NGDPD_YOY', 'NGDPD'], [2001, 2002])
+        self.assertEqual(result.years.tolist(), [2001, 2002])
+        np.testing.assert_allclose(result.values[0], [[10.0, 10.0], [np.nan, np.nan]])
+        np.testing.assert_array_equal(result.mask[0], [[True, True], [False, False]])
+        np.testing.assert_array_equal(result.values[1], [[110.0, 121.0], [np.nan, 60.0]])
+        self.assertIn("警告: CHN 在指标 D_NGDPD_YOY 中没有数据", result.warnings)
+
+    def test_cross_sectional_functions(self):
+        data = matrix(['NGDPD', 'LP'], ['USA', 'CHN', 'DEU'], [2020],
+                      [[[20.0], [15.0], [np.nan]], [[0.5], [1.5], [0.1]]])
+        result = self.engine.evaluate(data, ['D_NGDPD_SHARE', 'D_NGDPD_PC_RANK'], [2020])
+        np.testing.assert_allclose(result.values[0, :, 0], [20 / 35 * 100, 15 / 35 * 100, np.nan])
+        np.testing.assert_array_equal(result.values[1, :, 0], [1.0, 2.0, np.nan])
+
+    def test_define_rejects_unsafe_expression(self):
+        with self.assertRaises(ValueError):
+            self.engine.define('BAD', "__import__('os')")
+        self.assertFalse(self.engine.is_derived('BAD'))
+
+
+if __name__ == '__main__':
+    unittest.main()
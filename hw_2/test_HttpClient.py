@@ -0,0 +1,152 @@
+import unittest
+from unittest import mock
+import requests
+from HttpClient import CircuitBreaker, CircuitOpenError, ImfClient
+
+
+class FakeResponse:
+    """
+    模拟的 requests.Response，读取 content 时可以抛出指定的异常
+    """
+    def __init__(self, status_code=200, content_error=None):
+        self.status_code = status_code
+        self.headers = dict()
+        self.url = 'http://imf.test/x'
+        self._content_error = content_error
+
+    @property
+    def content(self):
+        if self._content_error is not None:
+            raise self._content_error
+        return b'{}'
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error", response=self)
+
+    def close(self):
+        pass
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('HttpClient.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+
+    def test_opens_after_threshold(self):
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.is_open)
+        self.assertFalse(self.breaker.allow())
+
+    def test_success_resets_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+
+    def test_half_open_allows_single_probe(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.now += 31
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+    def test_probe_success_closes(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.now += 31
+        self.breaker.allow()
+        self.breaker.record_success()
+        self.assertFalse(self.breaker.is_open)
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+    def test_probe_failure_reopens(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.now += 31
+        self.breaker.allow()
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.allow())
+        self.now += 31
+        self.assertTrue(self.breaker.allow())
+
+
+class ImfClientBreakerTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('HttpClient.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = ImfClient(base_url='http://imf.test', max_retries=0, rate=1000, burst=1000,
+                                failure_threshold=1, reset_timeout=30)
+
+    def _respond(self, *outcomes):
+        """
+        依次返回或抛出 outcomes 中的响应/异常
+        """
+        def get(*args, **kwargs):
+            outcome = outcomes[min(get.calls, len(outcomes) - 1)]
+            get.calls += 1
+            if isinstance(outcome, BaseException):
+                raise outcome
+            return outcome
+        get.calls = 0
+        self.client.session.get = get
+
+    def _open(self):
+        self._respond(requests.exceptions.ConnectionError("down"))
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.client.get('/x')
+        self.assertTrue(self.client.breaker.is_open)
+        with self.assertRaises(CircuitOpenError):
+            self.client.get('/x')
+        self.now += 31
+
+    def test_failed_probe_reopens(self):
+        self._open()
+        self._respond(requests.exceptions.Timeout("slow"))
+        with self.assertRaises(requests.exceptions.Timeout):
+            self.client.get('/x')
+        with self.assertRaises(CircuitOpenError):
+            self.client.get('/x')
+
+    def test_probe_with_other_request_error_is_recorded(self):
+        # 读取响应体时中断；请求本身抛出的不可重试错误
+        chunked = requests.exceptions.ChunkedEncodingError("truncated")
+        for error, outcome in ((chunked, FakeResponse(content_error=chunked)),
+                               (requests.exceptions.TooManyRedirects("loop"),) * 2):
+            with self.subTest(error=type(error).__name__):
+                self._open()
+                self._respond(outcome)
+                with self.assertRaises(type(error)):
+                    self.client.get('/x')
+                # 探测失败后熔断器重新打开，冷却后仍然放行下一次探测
+                with self.assertRaises(CircuitOpenError):
+                    self.client.get('/x')
+                self.now += 31
+                self._respond(FakeResponse())
+                self.client.get('/x')
+                self.assertFalse(self.client.breaker.is_open)
+
+    def test_client_error_does_not_trip(self):
+        self._respond(FakeResponse(status_code=404))
+        for _ in range(3):
+            with self.assertRaises(requests.exceptions.HTTPError):
+                self.client.get('/x')
+        self.assertFalse(self.client.breaker.is_open)
+
+    def test_retryable_status_trips(self):
+        self._respond(FakeResponse(status_code=503))
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.client.get('/x')
+        self.assertTrue(self.client.breaker.is_open)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+from unittest import mock
+import numpy as np
+from DataMatrix import ResultMatrix
+from DerivedIndicators import DerivedEngine
+from RankingIndex import CrossSection, RankingIndex
+
+
+class FakeCache:
+    def __init__(self):
+        self.listeners = []
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def write(self, indicator, years):
+        for listener in self.listeners:
+            listener(indicator, set(years))
+
+
+class FakeDataManager:
+    """
+    记录 query_matrix 调用的 DataManager 替身，值为 年份 + 国家/地区序号
+    """
+    def __init__(self):
+        self.cache = FakeCache()
+        self.derived_engine = DerivedEngine()
+        self.calls = []
+        self.error = None
+
+    def query_matrix(self, indicators, entities, years):
+        self.calls.append((indicators[0], list(years)))
+        result = ResultMatrix(indicators, entities, years)
+        result.values[0] = np.add.outer(np.arange(len(entities)), np.asarray(years, dtype=np.float64))
+        result.mask[:] = True
+        result.error = self.error
+        return result
+
+
+class FakeBasicInfoManager:
+    available_entities = ['USA', 'CHN', 'DEU']
+
+
+class CrossSectionTest(unittest.TestCase):
+    def setUp(self):
+        self.section = CrossSection(['A', 'B', 'C', 'D'], np.array([3.0, 5.0, 3.0, 1.0]))
+
+    def test_ties_share_rank(self):
+        self.assertEqual(self.section.top(3), [(1, 'B', 5.0), (2, 'A', 3.0), (2, 'C', 3.0)])
+        self.assertEqual(self.section.bottom(2), [(4, 'D', 1.0), (2, 'C', 3.0)])
+
+    def test_percentile_matches_numpy(self):
+        for q in (0, 25, 50, 90, 100):
+            with self.subTest(q=q):
+                self.assertAlmostEqual(self.section.percentile(q), np.percentile([3.0, 5.0, 3.0, 1.0], q))
+
+    def test_rank_of(self):
+        info = self.section.rank_of('A')
+        self.assertAlmostEqual(info.pop('percentile'), 100 / 3)
+        self.assertEqual(info, {'rank': 2, 'total': 4, 'value': 3.0})
+        self.assertIsNone(self.section.rank_of('E'))
+
+
+class RankingIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('RankingIndex.time.time', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.data_manager = FakeDataManager()
+        self.index = RankingIndex(self.data_manager, FakeBasicInfoManager(), years=range(2000, 2010),
+                                  max_age=3600, retry_interval=60)
+
+    def test_first_query_builds_all_years(self):
+        self.assertEqual(self.index.top('LP', 2005, 1), [(1, 'DEU', 2007.0)])
+        self.assertEqual(self.data_manager.calls, [('LP', list(range(2000, 2010)))])
+        self.index.rank_of('LP', 2001, 'USA')
+        self.assertEqual(len(self.data_manager.calls), 1)
+        self.assertIsNone(self.index.lookup('NGDPD', 2005))
+
+    def test_cache_write_rebuilds_only_affected_years(self):
+        self.index.prepare('LP')
+        self.data_manager.cache.write('NGDPD', [2003])
+        self.data_manager.cache.write('LP', [2003, 2012])
+        self.index.prepare('LP')
+        self.assertEqual(self.data_manager.calls[-1], ('LP', [2003]))
+        self.index.prepare('LP')
+        self.assertEqual(len(self.data_manager.calls), 2)
+
+    def test_derived_indicator_marks_lookback_years(self):
+        self.index.prepare('D_NGDPD_YOY')
+        self.data_manager.cache.write('NGDPD', [2004])
+        self.index.prepare('D_NGDPD_YOY')
+        self.assertEqual(self.data_manager.calls[-1], ('D_NGDPD_YOY', [2004, 2005]))
+
+    def test_base_year_change_rebuilds_everything(self):
+        self.index.prepare('D_NGDPD_IDX2000')
+        self.data_manager.cache.write('NGDPD', [2000])
+        self.index.prepare('D_NGDPD_IDX2000')
+        self.assertEqual(self.data_manager.calls[-1], ('D_NGDPD_IDX2000', list(range(2000, 2010))))
+
+    def test_writes_before_first_build_are_ignored(self):
+        self.data_manager.cache.write('LP', [2003])
+        self.index.prepare('LP')
+        self.index.prepare('LP')
+        self.assertEqual(len(self.data_manager.calls), 1)
+
+    def test_index_expires_after_max_age(self):
+        self.index.prepare('LP')
+        self.now += 3601
+        self.index.prepare('LP')
+        self.assertEqual(self.data_manager.calls[-1], ('LP', list(range(2000, 2010))))
+
+    def test_failed_build_is_retried_after_interval(self):
+        self.data_manager.error = "上游不可用"
+        self.assertEqual(self.index.prepare('LP'), "上游不可用")
+        # 失败时仍使用部分数据建立索引
+        self.assertIsNotNone(self.index.lookup('LP', 2005))
+        self.now += 30
+        self.assertIsNone(self.index.prepare('LP'))
+        self.assertEqual(len(self.data_manager.calls), 1)
+        self.data_manager.error = None
+        self.now += 31
+        self.assertIsNone(self.index.prepare('LP'))
+        self.assertEqual(len(self.data_manager.calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import json
+import random
+import unittest
+import numpy as np
+from StreamParser import ValuesStreamParser, parse_values_stream
+
+BODY = {
+    'values': {
+        'NGDP_RPCH': {
+            'USA': {'2019': 2.3, '2020': -2.8, '2021': 5.9},
+            'CHN': {'2019': 6.0, '2020': None, '2021': 8.4},
+            'DEU': {'2021': 3.1, '2019': 1.1},
+        },
+        'LP': {
+            'USA': {'2020': 331.5},
+        },
+    },
+    'api': {'version': '1', 'output-method': 'json'},
+}
+
+
+class FakeResponse:
+    def __init__(self, payload, chunk_sizes):
+        self.payload = payload
+        self.chunk_sizes = chunk_sizes
+        self.closed = False
+
+    def iter_content(self, chunk_size=None):
+        pos = 0
+        sizes = iter(self.chunk_sizes)
+        while pos < len(self.payload):
+            size = next(sizes, chunk_size)
+            yield self.payload[pos:pos + size]
+            pos += size
+
+    def close(self):
+        self.closed = True
+
+
+def parse(payload, chunk_size, entities=None, years=None):
+    parser = ValuesStreamParser(entities, years)
+    for i in range(0, len(payload), chunk_size):
+        parser.feed(payload[i:i + chunk_size])
+    return parser.close()
+
+
+class ValuesStreamParserTest(unittest.TestCase):
+    payload = json.dumps(BODY, indent=1).encode('utf-8')
+
+    def assertMatchesBody(self, results, indicator, entities=None, years=None):
+        expected = {(entity, int(year)): value
+                    for entity, series in BODY['values'][indicator].items() if not entities or entity in entities
+                    for year, value in series.items() if value is not None and (not years or int(year) in years)}
+        self.assertEqual(dict(((entity, year), value) for entity, year, value in results[indicator].cells()), expected)
+
+    def test_any_chunking_gives_the_same_result(self):
+        for chunk_size in (1, 2, 3, 7, 16, 64, len(self.payload)):
+            with self.subTest(chunk_size=chunk_size):
+                results = parse(self.payload, chunk_size)
+                self.assertEqual(set(results), {'NGDP_RPCH', 'LP'})
+                self.assertMatchesBody(results, 'NGDP_RPCH')
+                self.assertMatchesBody(results, 'LP')
+
+    def test_years_are_sorted_when_not_fixed(self):
+        arrays = parse(self.payload, 5)['NGDP_RPCH']
+        self.assertEqual(arrays.years, [2019, 2020, 2021])
+        self.assertEqual(arrays.values.shape, (3, 3))
+        self.assertEqual(arrays.values[arrays.entity_index['DEU']].tolist()[0], 1.1)
+
+    def test_requested_entities_and_years_are_preallocated(self):
+        arrays = parse(self.payload, 11, entities=['CHN', 'FRA', 'USA'], years=[2021, 2020])['NGDP_RPCH']
+        self.assertEqual(arrays.entities, ['CHN', 'FRA', 'USA'])
+        self.assertEqual(arrays.years, [2020, 2021])
+        np.testing.assert_array_equal(arrays.mask, [[False, True], [False, False], [True, True]])
+        self.assertMatchesBody({'NGDP_RPCH': arrays}, 'NGDP_RPCH', entities={'CHN', 'USA'}, years={2020, 2021})
+
+    def test_object_without_values_is_empty(self):
+        self.assertEqual(parse(b'{"api": {"version": "1"}}', 4), {})
+
+    def test_non_object_body_is_rejected(self):
+        with self.assertRaises(ValueError):
+            parse(b'<html><body>Service Unavailable</body></html>', 8)
+
+    def test_truncated_body_is_rejected(self):
+        with self.assertRaises(ValueError):
+            parse(self.payload[:len(self.payload) // 2], 8)
+
+    def test_parse_values_stream_reads_and_closes_response(self):
+        rng = random.Random(0)
+        response = FakeResponse(self.payload, [rng.randint(1, 40) for _ in range(len(self.payload))])
+        results, size = parse_values_stream(response)
+        self.assertTrue(response.closed)
+        self.assertEqual(size, len(self.payload))
+        self.assertMatchesBody(results, 'NGDP_RPCH')
+
+
+if __name__ == '__main__':
+    unittest.main()
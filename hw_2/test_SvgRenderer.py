@@ -0,0 +1,32 @@
+import unittest
+import numpy as np
+from SvgRenderer import TAB10, lttb, series_color
+
+
+class LttbTest(unittest.TestCase):
+    def test_short_or_disabled_input_is_unchanged(self):
+        x, y = [1, 2, 3, 4], [4, 3, 2, 1]
+        for threshold in (None, 2, 4, 10):
+            with self.subTest(threshold=threshold):
+                self.assertEqual(lttb(x, y, threshold), (x, y))
+
+    def test_keeps_endpoints_and_extremes(self):
+        x = np.arange(1000, dtype=np.float64)
+        y = np.sin(x / 50)
+        y[437] = 10.0
+        sx, sy = lttb(x, y, 50)
+        self.assertEqual(len(sx), 50)
+        self.assertEqual((sx[0], sx[-1]), (0.0, 999.0))
+        self.assertTrue(np.all(np.diff(sx) > 0))
+        self.assertIn(437.0, sx)
+        np.testing.assert_array_equal(sy, y[sx.astype(np.int64)])
+
+
+class SeriesColorTest(unittest.TestCase):
+    def test_colors_cycle_through_palette(self):
+        self.assertEqual(series_color(0), TAB10[0])
+        self.assertEqual(series_color(len(TAB10) + 3), TAB10[3])
+
+
+if __name__ == '__main__':
+    unittest.main()